@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import contextlib
+import multiprocessing
+
+import nm_pathfinder
+import nm_compactmesh
+
+ALGORITHMS = dict(
+    find_path=nm_pathfinder.find_path,
+    astar_find_path=nm_pathfinder.astar_find_path,
+)
+
+# set once in each worker process by init_worker
+worker_mesh = None
+worker_algorithm = None
+
+
+def read_queries(stream):
+    """
+    Parses (source, destination) pairs, one "sx sy dx dy" query per line.
+    Commas may be used instead of spaces; blank lines and lines starting with
+    # are skipped. Malformed lines are reported on stderr and skipped.
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            sx, sy, dx, dy = map(int, line.replace(',', ' ').split())
+        except ValueError:
+            sys.stderr.write("line %d: expected sx sy dx dy, got %r\n" % (number, line))
+            continue
+        yield (sx, sy), (dx, dy)
+
+
+def init_worker(mesh_filename, algorithm):
+    global worker_mesh, worker_algorithm
+    worker_mesh = nm_compactmesh.load_mesh(mesh_filename)
+    worker_algorithm = ALGORITHMS[algorithm]
+
+
+def run_query(query):
+    source_point, destination_point = query
+
+    # the pathfinders report on stdout, which is where the results go
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        path, boxes = worker_algorithm(source_point, destination_point, worker_mesh)
+
+    # without a path the pathfinders still return [source, destination], the
+    # same as a straight path inside one box
+    src_box = nm_pathfinder.find_box(source_point, worker_mesh)
+    dst_box = nm_pathfinder.find_box(destination_point, worker_mesh)
+    found = nm_pathfinder.connected(src_box, dst_box, worker_mesh)
+
+    return {
+        'source': source_point,
+        'destination': destination_point,
+        'found': found,
+        'path': path if found else None,
+        # over every segment; path_len counts a straight two-point path as 0
+        'length': sum(nm_pathfinder.euclidean(a, b) for a, b in zip(path, path[1:])) if found else None,
+        'explored': len(boxes),
+    }
+
+
+def batch_find_paths(mesh_filename, queries, processes=None, algorithm='find_path', chunksize=16):
+    """
+    Runs many path queries over one mesh in a process pool. Each worker loads
+    the mesh once, and results are yielded in query order as they complete.
+
+    Args:
+        mesh_filename: a .mesh.pickle file or a compact mesh directory
+        queries: iterable of (source_point, destination_point) pairs
+        processes: number of worker processes, defaults to the CPU count
+        algorithm: name of the pathfinder to run, a key of ALGORITHMS
+        chunksize: number of queries handed to a worker at a time
+
+    Returns:
+        A generator of dicts with the source, destination, whether a path was
+        found, the path and its length (None if not found) and the number of
+        explored boxes of every query
+    """
+    with multiprocessing.Pool(processes, init_worker, (mesh_filename, algorithm)) as pool:
+        for result in pool.imap(run_query, queries, chunksize):
+            yield result
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4, 5):
+        print("usage: %s map.mesh.pickle queries.txt|- [processes] [%s]"
+              % (sys.argv[0], '|'.join(ALGORITHMS)))
+        sys.exit(-1)
+
+    mesh_filename, query_filename = sys.argv[1], sys.argv[2]
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    algorithm = sys.argv[4] if len(sys.argv) > 4 else 'find_path'
+    if algorithm not in ALGORITHMS:
+        print("algorithm not in " + ", ".join(ALGORITHMS))
+        sys.exit(-1)
+
+    stream = sys.stdin if query_filename == '-' else open(query_filename)
+    with stream:
+        for result in batch_find_paths(mesh_filename, read_queries(stream), processes, algorithm):
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
@@ -0,0 +1,530 @@
+import os
+import sys
+import glob
+import pickle
+import contextlib
+import random
+import tempfile
+import tracemalloc
+from timeit import default_timer as time
+
+import nm_pathfinder
+import nm_compactmesh
+import nm_meshbuilder
+import nm_hierarchy
+import nm_meshupdate
+import nm_pyramid
+import nm_distancefield
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'input')
+
+QUERIES = 2000
+SEED = 146
+
+
+def load_meshes(filenames=None):
+    if not filenames:
+        filenames = sorted(glob.glob(os.path.join(INPUT_DIR, '*.mesh.pickle')))
+
+    meshes = []
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            meshes.append((os.path.basename(filename), pickle.load(f)))
+    return meshes
+
+
+def map_images():
+    # the bundled maps, without the rendered meshes and the unscaled originals
+    filenames = glob.glob(os.path.join(INPUT_DIR, '*.png')) + glob.glob(os.path.join(INPUT_DIR, '*.gif'))
+    return sorted(f for f in filenames if '.mesh.' not in f and '-orig' not in f)
+
+
+def grid_mesh(n, size=8):
+    """
+    Builds an n by n mesh of equally sized boxes, used to show how a cost
+    scales with the number of boxes independently of any particular map
+    """
+    boxes = [(x * size, (x + 1) * size, y * size, (y + 1) * size)
+             for x in range(n) for y in range(n)]
+    adj = {}
+    for x in range(n):
+        for y in range(n):
+            adj[boxes[x * n + y]] = [boxes[i * n + j]
+                                     for i, j in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+                                     if 0 <= i < n and 0 <= j < n]
+    return {'boxes': boxes, 'adj': adj}
+
+
+def random_points(mesh, count, rng):
+    boxes = mesh['boxes']
+    x_lo = min(box[0] for box in boxes)
+    x_hi = max(box[1] for box in boxes)
+    y_lo = min(box[2] for box in boxes)
+    y_hi = max(box[3] for box in boxes)
+    return [(rng.randint(int(x_lo), int(x_hi)), rng.randint(int(y_lo), int(y_hi)))
+            for _ in range(count)]
+
+
+def time_per_call(function, points, mesh):
+    start = time()
+    for p in points:
+        function(p, mesh)
+    return (time() - start) / len(points)
+
+
+def bench_find_box(meshes, queries=QUERIES, seed=SEED):
+    """
+    Times the linear scan against the grid index for point location
+
+    Returns:
+        A list of (name, box count, index build seconds, linear us, indexed us)
+    """
+    rng = random.Random(seed)
+    rows = []
+    for name, mesh in meshes:
+        mesh = dict(mesh)
+        mesh.pop('index', None)
+        points = random_points(mesh, queries, rng)
+
+        start = time()
+        mesh['index'] = nm_pathfinder.build_box_index(mesh)
+        build = time() - start
+
+        for p in points:
+            assert nm_pathfinder.find_box(p, mesh) == nm_pathfinder.find_box_linear(p, mesh)
+
+        linear = time_per_call(nm_pathfinder.find_box_linear, points, mesh)
+        indexed = time_per_call(nm_pathfinder.find_box, points, mesh)
+        rows.append((name, len(mesh['boxes']), build, linear * 1e6, indexed * 1e6))
+    return rows
+
+
+def measure_load(load):
+    tracemalloc.start()
+    start = time()
+    mesh = load()
+    elapsed = time() - start
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return mesh, elapsed, size
+
+
+def bench_compact_mesh(meshes, queries=50, seed=SEED):
+    """
+    Compares the pickled dict mesh with the memory mapped compact mesh
+
+    Returns:
+        A list of (name, box count, pickle load ms, pickle KiB, compact load ms,
+        compact KiB, dict mesh us per query, compact mesh us per query)
+    """
+    rng = random.Random(seed)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, mesh in meshes:
+            mesh = dict(mesh)
+            mesh.pop('index', None)
+            pickled = os.path.join(tmp, name + '.pickle')
+            compact = os.path.join(tmp, name + '.compact')
+            with open(pickled, 'wb') as f:
+                pickle.dump(mesh, f, protocol=pickle.HIGHEST_PROTOCOL)
+            nm_compactmesh.save_compact_mesh(nm_compactmesh.compile_mesh(mesh), compact)
+
+            dict_mesh, dict_load, dict_size = measure_load(lambda: nm_compactmesh.load_mesh(pickled))
+            compact_mesh, compact_load, compact_size = measure_load(lambda: nm_compactmesh.load_mesh(compact))
+
+            points = random_points(mesh, 2 * queries, rng)
+            pairs = list(zip(points[::2], points[1::2]))
+            timings = []
+            # the pathfinders report missing paths on stdout
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                for m in (dict_mesh, compact_mesh):
+                    start = time()
+                    for src, dst in pairs:
+                        nm_pathfinder.astar_find_path(src, dst, m)
+                    timings.append((time() - start) / len(pairs))
+
+            rows.append((name, len(mesh['boxes']), dict_load * 1e3, dict_size / 1024.0,
+                         compact_load * 1e3, compact_size / 1024.0, timings[0] * 1e6, timings[1] * 1e6))
+    return rows
+
+
+def bench_portals(meshes, seed=SEED):
+    """
+    Times computing an entry point with find_next_point against clamping onto
+    the precomputed portal, over every adjacency of each mesh
+
+    Returns:
+        A list of (name, adjacency count, table build ms, find_next_point ns,
+        clamp_to_portal ns)
+    """
+    rng = random.Random(seed)
+    rows = []
+    for name, mesh in meshes:
+        start = time()
+        portals = nm_pathfinder.build_portals(mesh)
+        build = time() - start
+
+        relaxations = []
+        for box, neighbors in mesh['adj'].items():
+            for neighbor, portal in zip(neighbors, portals[box]):
+                p = (rng.uniform(box[0], box[1]), rng.uniform(box[2], box[3]))
+                relaxations.append((p, box, neighbor, portal))
+                assert nm_pathfinder.find_next_point(p, box, neighbor) == nm_pathfinder.clamp_to_portal(p, portal)
+        if not relaxations:
+            continue
+
+        start = time()
+        for p, box, neighbor, portal in relaxations:
+            nm_pathfinder.find_next_point(p, box, neighbor)
+        computed = (time() - start) / len(relaxations)
+
+        start = time()
+        for p, box, neighbor, portal in relaxations:
+            nm_pathfinder.clamp_to_portal(p, portal)
+        stored = (time() - start) / len(relaxations)
+
+        rows.append((name, len(relaxations), build * 1e3, computed * 1e9, stored * 1e9))
+    return rows
+
+
+def bench_build(filenames, min_feature_size=16):
+    """
+    Times nm_meshbuilder.build_mesh on each map image
+
+    Returns:
+        A list of (name, image shape, box count, edge count, build ms)
+    """
+    rows = []
+    for filename in filenames:
+        image = nm_meshbuilder.load_image(filename)
+        start = time()
+        mesh = nm_meshbuilder.build_mesh(image, min_feature_size)
+        elapsed = time() - start
+        edges = sum(len(neighbors) for neighbors in mesh['adj'].values()) // 2
+        rows.append((os.path.basename(filename), image.shape, len(mesh['boxes']), edges, elapsed * 1e3))
+    return rows
+
+
+def bench_pyramid(filenames, sizes=(16, 64, 256)):
+    """
+    Times build_pyramid against one build_mesh per feature size, checking that
+    every level is the mesh build_mesh gives
+
+    Returns:
+        A list of (name, box count per level, separate ms, pyramid ms)
+    """
+    rows = []
+    for filename in filenames:
+        image = nm_meshbuilder.load_image(filename)
+        start = time()
+        meshes = [nm_meshbuilder.build_mesh(image, size) for size in sizes]
+        separate = time() - start
+
+        start = time()
+        pyramid = nm_meshbuilder.build_pyramid(image, sizes)
+        elapsed = time() - start
+        for mesh, level in zip(meshes, pyramid['levels']):
+            assert mesh['boxes'] == level['boxes'] and mesh['adj'] == level['adj']
+
+        rows.append((os.path.basename(filename), '/'.join(str(len(mesh['boxes'])) for mesh in meshes),
+                     separate * 1e3, elapsed * 1e3))
+    return rows
+
+
+def bench_pyramid_search(filenames, sizes=(16, 64, 256), queries=200, seed=SEED):
+    """
+    Runs pyramid_find_path and astar_find_path on the same connected queries
+    over the finest level of each map's pyramid
+
+    Returns:
+        A list of (name, paths, astar expanded, pyramid expanded, astar length,
+        pyramid length, % of pyramid paths longer, astar ms, pyramid ms),
+        expansions (over every level for the pyramid), lengths and times
+        averaged per path
+    """
+    rng = random.Random(seed)
+    rows = []
+    for filename in filenames:
+        pyramid = nm_meshbuilder.build_pyramid(nm_meshbuilder.load_image(filename), sizes)
+        fine = pyramid['levels'][0]
+        if not fine['boxes']:
+            continue
+        points = random_points(fine, 2 * queries, rng)
+        pairs = [(src, dst) for src, dst in zip(points[::2], points[1::2])
+                 if nm_pathfinder.connected(nm_pathfinder.find_box(src, fine),
+                                            nm_pathfinder.find_box(dst, fine), fine)]
+        if not pairs:
+            continue
+
+        totals = [0.0] * 6
+        longer = 0
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for src, dst in pairs:
+                lengths = []
+                for k, search in enumerate((lambda: nm_pathfinder.astar_find_path(src, dst, fine),
+                                            lambda: nm_pyramid.pyramid_find_path(src, dst, pyramid))):
+                    start = time()
+                    path, boxes = search()
+                    totals[4 + k] += time() - start
+                    totals[k] += len(boxes)
+                    lengths.append(sum(nm_pathfinder.euclidean(a, b) for a, b in zip(path, path[1:])))
+                    totals[2 + k] += lengths[-1]
+                longer += lengths[1] > lengths[0] + 1e-6
+
+        averages = [total / len(pairs) for total in totals]
+        rows.append((os.path.basename(filename), len(pairs), averages[0], averages[1], averages[2], averages[3],
+                     100.0 * longer / len(pairs), averages[4] * 1e3, averages[5] * 1e3))
+    return rows
+
+
+def bench_parallel_build(filename, scale=4, process_counts=(1, 2, 4, 8), min_feature_size=16):
+    """
+    Times build_mesh_parallel on a map blown up by scale in each direction,
+    checking that every process count gives the serial mesh
+
+    Returns:
+        A list of (processes, image shape, box count, build ms, speedup)
+    """
+    image = nm_meshbuilder.load_image(filename)
+    image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+
+    start = time()
+    serial = nm_meshbuilder.build_mesh(image, min_feature_size)
+    baseline = time() - start
+    rows = [(0, image.shape, len(serial['boxes']), baseline * 1e3, 1.0)]
+
+    for processes in process_counts:
+        start = time()
+        mesh = nm_meshbuilder.build_mesh_parallel(image, min_feature_size, processes)
+        elapsed = time() - start
+        assert mesh['boxes'] == serial['boxes'] and mesh['adj'] == serial['adj']
+        rows.append((processes, image.shape, len(mesh['boxes']), elapsed * 1e3, baseline / elapsed))
+    return rows
+
+
+def bench_incremental(filenames, edits=20, size=32, min_feature_size=16, seed=SEED):
+    """
+    Paints random obstacles onto each map and times MeshUpdater patching the
+    mesh against rebuilding it from scratch
+
+    Returns:
+        A list of (name, box count, full build ms, update ms, boxes changed),
+        the last two averaged per edit
+    """
+    rng = random.Random(seed)
+    rows = []
+    for filename in filenames:
+        updater = nm_meshupdate.MeshUpdater(nm_meshbuilder.load_image(filename), min_feature_size)
+        width, height = updater.image.shape
+
+        start = time()
+        nm_meshbuilder.build_mesh(updater.image, min_feature_size)
+        full = time() - start
+
+        elapsed = changed = 0
+        for _ in range(edits):
+            x, y = rng.randrange(max(1, width - size)), rng.randrange(max(1, height - size))
+            start = time()
+            removed, added = updater.paint((x, x + size, y, y + size), rng.choice((0, 255)))
+            elapsed += time() - start
+            changed += len(removed) + len(added)
+
+        rows.append((os.path.basename(filename), len(updater.mesh['boxes']), full * 1e3,
+                     elapsed / edits * 1e3, changed / edits))
+    return rows
+
+
+def bench_distance_field(meshes, destinations=200, seed=SEED):
+    """
+    Compares one distance field plus a path extraction per destination against
+    an A* search per destination, all from the same source
+
+    Returns:
+        A list of (name, box count, field build ms, extraction us per
+        destination, astar us per destination)
+    """
+    rng = random.Random(seed)
+    rows = []
+    for name, mesh in meshes:
+        pairs = box_center_pairs(mesh, destinations, rng)
+        source = pairs[0][0]
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time()
+            field = nm_distancefield.build_distance_field(source, mesh)
+            build = time() - start
+
+            start = time()
+            for _, dst in pairs:
+                nm_distancefield.field_path(field, dst, mesh)
+            extract = (time() - start) / len(pairs)
+
+            start = time()
+            for _, dst in pairs:
+                nm_pathfinder.astar_find_path(source, dst, mesh)
+            search = (time() - start) / len(pairs)
+
+        rows.append((name, len(mesh['boxes']), build * 1e3, extract * 1e6, search * 1e6))
+    return rows
+
+
+def box_center_pairs(mesh, count, rng):
+    # query endpoints at box centers so every query starts and ends on the mesh
+    centers = [(int((box[0] + box[1]) // 2), int((box[2] + box[3]) // 2)) for box in mesh['boxes']]
+    return [(rng.choice(centers), rng.choice(centers)) for _ in range(count)]
+
+
+def box_edge_pairs(mesh, count, rng):
+    # query endpoints on box sides, where viewer clicks often land, so many of
+    # them lie on a portal
+    def edge_point(box):
+        x1, x2, y1, y2 = (int(v) for v in box)
+        side = rng.randrange(4)
+        if side < 2:
+            return ((x1, x2)[side], rng.randint(y1, y2))
+        return (rng.randint(x1, x2), (y1, y2)[side - 2])
+    return [(edge_point(rng.choice(mesh['boxes'])), edge_point(rng.choice(mesh['boxes']))) for _ in range(count)]
+
+
+def bench_hierarchy(meshes, queries=200, seed=SEED):
+    """
+    Compares expanded boxes, path length and time of the flat A* against the
+    hierarchical search
+
+    Returns:
+        A list of (name, box count, hierarchy build ms, flat expanded,
+        hierarchical expanded, flat length, hierarchical length, flat ms,
+        hierarchical ms), all averaged per query
+    """
+    rng = random.Random(seed)
+    rows = []
+    for name, mesh in meshes:
+        mesh = dict(mesh)
+        mesh.pop('hierarchy', None)
+        start = time()
+        nm_hierarchy.get_hierarchy(mesh)
+        build = time() - start
+
+        totals = [0.0] * 6
+        pairs = box_center_pairs(mesh, queries, rng)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for src, dst in pairs:
+                for k, search in enumerate((nm_pathfinder.astar_find_path, nm_hierarchy.hierarchical_find_path)):
+                    start = time()
+                    path, boxes = search(src, dst, mesh)
+                    totals[4 + k] += time() - start
+                    totals[k] += len(boxes)
+                    totals[2 + k] += nm_pathfinder.path_len(path)
+
+        averages = [total / len(pairs) for total in totals]
+        rows.append((name, len(mesh['boxes']), build * 1e3, averages[0], averages[1], averages[2],
+                     averages[3], averages[4] * 1e3, averages[5] * 1e3))
+    return rows
+
+
+def bench_smoothing(meshes, queries=200, seed=SEED):
+    """
+    Measures what the funnel pass gains over placing points portal by portal
+    along the same corridor, and what it costs, over queries between box
+    centers and between points on box sides
+
+    Returns:
+        A list of (name, paths, portal length, funnel length, length reduction %,
+        portal waypoints, funnel waypoints, portal pass us, funnel pass us),
+        lengths and waypoints averaged per path
+    """
+    rng = random.Random(seed)
+    rows = []
+    for name, mesh in meshes:
+        totals = [0.0] * 6
+        paths = 0
+        pairs = box_center_pairs(mesh, queries // 2, rng) + box_edge_pairs(mesh, queries - queries // 2, rng)
+        for src, dst in pairs:
+            corridor, boxes = nm_pathfinder.find_corridor(src, dst, mesh)
+            if corridor is None:
+                continue
+            paths += 1
+            lengths = []
+            for k, place in enumerate((nm_pathfinder.corridor_path, nm_pathfinder.funnel_path)):
+                start = time()
+                path = place(src, dst, corridor, mesh)
+                totals[4 + k] += time() - start
+                lengths.append(sum(nm_pathfinder.euclidean(a, b) for a, b in zip(path, path[1:])))
+                totals[k] += lengths[-1]
+                totals[2 + k] += len(path)
+            # the funnel path is the shortest in the corridor, so never longer
+            assert lengths[1] <= lengths[0] + 1e-6, (name, src, dst)
+        if not paths:
+            continue
+
+        averages = [total / paths for total in totals]
+        reduction = 100.0 * (1 - totals[1] / totals[0]) if totals[0] else 0.0
+        rows.append((name, paths, averages[0], averages[1], reduction, averages[2], averages[3],
+                     averages[4] * 1e6, averages[5] * 1e6))
+    return rows
+
+
+if __name__ == '__main__':
+
+    print("%-32s %12s %8s %8s %10s" % ('map', 'pixels', 'boxes', 'edges', 'build ms'))
+    for name, shape, count, edges, build in bench_build(map_images()):
+        print("%-32s %12s %8d %8d %10.1f" % (name, '%dx%d' % shape, count, edges, build))
+    print()
+
+    print("%-32s %16s %12s %12s" % ('map', 'boxes', 'separate ms', 'pyramid ms'))
+    for row in bench_pyramid(map_images()):
+        print("%-32s %16s %12.1f %12.1f" % row)
+    print()
+
+    print("%-32s %6s %10s %10s %10s %10s %8s %10s %10s" % ('map', 'paths', 'astar exp', 'pyr exp',
+                                                         'astar len', 'pyr len', 'longer %',
+                                                         'astar ms', 'pyr ms'))
+    for row in bench_pyramid_search(map_images()):
+        print("%-32s %6d %10.1f %10.1f %10.1f %10.1f %8.1f %10.2f %10.2f" % row)
+    print()
+
+    print("%-10s %12s %8s %10s %8s" % ('processes', 'pixels', 'boxes', 'build ms', 'speedup'))
+    for processes, shape, count, build, speedup in bench_parallel_build(os.path.join(INPUT_DIR, 'homer.png')):
+        print("%-10s %12s %8d %10.1f %8.2f" % (processes or 'serial', '%dx%d' % shape, count, build, speedup))
+    print()
+
+    print("%-32s %8s %10s %10s %8s" % ('map', 'boxes', 'full ms', 'update ms', 'changed'))
+    for row in bench_incremental(map_images()):
+        print("%-32s %8d %10.1f %10.1f %8.1f" % row)
+    print()
+
+    meshes = load_meshes(sys.argv[1:])
+    meshes += [('grid %dx%d' % (n, n), grid_mesh(n)) for n in (10, 30, 100, 200)]
+
+    print("%-32s %8s %10s %12s %12s" % ('mesh', 'boxes', 'build ms', 'linear us', 'indexed us'))
+    for name, count, build, linear, indexed in bench_find_box(meshes):
+        print("%-32s %8d %10.2f %12.2f %12.2f" % (name, count, build * 1e3, linear, indexed))
+
+    print()
+    print("%-32s %8s %10s %10s %10s %10s %12s %12s" % ('mesh', 'boxes', 'pkl ms', 'pkl KiB',
+                                                     'cmp ms', 'cmp KiB', 'dict us', 'compact us'))
+    for row in bench_compact_mesh(meshes):
+        print("%-32s %8d %10.2f %10.1f %10.2f %10.1f %12.1f %12.1f" % row)
+
+    print()
+    print("%-32s %8s %10s %14s %14s" % ('mesh', 'edges', 'build ms', 'computed ns', 'stored ns'))
+    for row in bench_portals(meshes):
+        print("%-32s %8d %10.2f %14.1f %14.1f" % row)
+
+    print()
+    print("%-32s %8s %10s %10s %10s %10s %10s %10s %10s" % ('mesh', 'boxes', 'build ms', 'flat exp',
+                                                          'hier exp', 'flat len', 'hier len',
+                                                          'flat ms', 'hier ms'))
+    for row in bench_hierarchy(meshes):
+        print("%-32s %8d %10.2f %10.1f %10.1f %10.1f %10.1f %10.2f %10.2f" % row)
+
+    print()
+    print("%-32s %6s %10s %10s %8s %10s %10s %10s %10s" % ('mesh', 'paths', 'portal len', 'funnel len',
+                                                         'saved %', 'portal pts', 'funnel pts',
+                                                         'portal us', 'funnel us'))
+    for row in bench_smoothing(meshes):
+        print("%-32s %6d %10.1f %10.1f %8.2f %10.1f %10.1f %10.1f %10.1f" % row)
+
+    print()
+    print("%-32s %8s %10s %12s %12s" % ('mesh', 'boxes', 'field ms', 'extract us', 'astar us'))
+    for row in bench_distance_field(meshes):
+        print("%-32s %8d %10.2f %12.1f %12.1f" % row)
@@ -0,0 +1,281 @@
+import os
+import sys
+import pickle
+from collections.abc import Mapping, Sequence
+
+import numpy
+
+import nm_pathfinder
+
+# files making up a compact mesh directory, one .npy array each
+ARRAYS = ('boxes', 'box_order', 'adj_indptr', 'adj_indices', 'adj_portals', 'components',
+          'cell_indptr', 'cell_indices', 'grid')
+
+# box ids sorted on these coordinates, in this order, make up box_order
+SORT_COLUMNS = (0, 2, 1, 3)
+
+
+class BoxTuple(tuple):
+    """ A box tuple that remembers its id, so handing it back to the mesh skips the search. """
+
+    def __new__(cls, coords, box_id):
+        box = tuple.__new__(cls, coords)
+        box.id = box_id
+        return box
+
+
+class BoxList(Sequence):
+    """ Read-only list of box tuples backed by the (N, 4) coordinate array. """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def __len__(self):
+        return len(self.mesh.boxes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        # the box keeps its row as its id, so it has to be the real row
+        if (i < 0):
+            i += len(self)
+        if (i < 0 or i >= len(self)):
+            raise IndexError('box index out of range')
+        return self.mesh.box(i)
+
+
+class BoxMap(Mapping):
+    """ Read-only box -> value mapping over a CSR table (indptr, values).
+
+    Nothing is built per box at load time. The list of a box is made the first
+    time it is looked up and kept by id, so a search reads the same list from
+    then on instead of converting the rows again.
+    """
+
+    def __init__(self, mesh, indptr, values, as_boxes=True):
+        self.mesh = mesh
+        self.indptr = indptr
+        self.values = values
+        self.as_boxes = as_boxes
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.mesh.boxes)
+
+    def __iter__(self):
+        return iter(self.mesh['boxes'])
+
+    def __getitem__(self, box):
+        i = self.mesh.box_id(box)
+        value = self.cache.get(i)
+        if (value is None):
+            rows = self.values[self.indptr[i]:self.indptr[i + 1]]
+            value = self.cache[i] = self.mesh.box_list(rows) if self.as_boxes else [tuple(row) for row in rows.tolist()]
+        return value
+
+
+class BoxValues(Mapping):
+    """ Read-only box -> value mapping over an array with one entry per box id. """
+
+    def __init__(self, mesh, values):
+        self.mesh = mesh
+        self.values = values
+
+    def __len__(self):
+        return len(self.mesh.boxes)
+
+    def __iter__(self):
+        return iter(self.mesh['boxes'])
+
+    def __getitem__(self, box):
+        return self.values[self.mesh.box_id(box)].item()
+
+
+class CellMap(object):
+    """ Dense grid of cells answering the same .get() lookups as the dict built by build_box_index. """
+
+    def __init__(self, indptr, indices, origin, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.origin = origin
+        self.shape = shape
+
+    def get(self, cell, default=None):
+        cx = cell[0] - self.origin[0]
+        cy = cell[1] - self.origin[1]
+        if (cx < 0 or cy < 0 or cx >= self.shape[0] or cy >= self.shape[1]):
+            return default
+        i = cx * self.shape[1] + cy
+        return self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()
+
+
+class CompactMesh(dict):
+    """ A mesh whose entries are views over flat NumPy arrays.
+
+    Boxes keep their position in the dict mesh as their id, so find_box breaks
+    ties on shared edges the same way, and box_order lists the ids in
+    (x1, y1, x2, y2) order so a box tuple can be turned back into its id by
+    binary search. Box tuples are made on first use and kept by id, as are the
+    adjacency and portal lists. Adjacency and the point location
+    grid are stored in CSR form (an offsets array plus one flat array of ids),
+    with the portal of every adjacency stored alongside it, and the connected
+    component of every box is kept in one more array. Since it is still a dict
+    with "boxes", "adj", "portals", "components" and "index" entries, the
+    pathfinders run on it unchanged.
+    """
+
+    def __init__(self, arrays):
+        super().__init__()
+        self.arrays = arrays
+        self.boxes = arrays['boxes']
+        self.order = arrays['box_order']
+        self.columns = [self.boxes[self.order, column] for column in range(4)]
+        self.box_cache = {}
+
+        grid = arrays['grid']
+        cells = CellMap(arrays['cell_indptr'], arrays['cell_indices'],
+                        (int(grid[1]), int(grid[2])), (int(grid[3]), int(grid[4])))
+
+        self['boxes'] = BoxList(self)
+        self['adj'] = BoxMap(self, arrays['adj_indptr'], arrays['adj_indices'])
+        self['portals'] = BoxMap(self, arrays['adj_indptr'], arrays['adj_portals'], as_boxes=False)
+        self['components'] = BoxValues(self, arrays['components'])
+        self['index'] = {'cell_size': grid[0].item(), 'cells': cells}
+
+    def box(self, i):
+        i = int(i)
+        box = self.box_cache.get(i)
+        if (box is None):
+            box = self.box_cache[i] = BoxTuple(self.boxes[i].tolist(), i)
+        return box
+
+    def box_list(self, ids):
+        return [self.box(i) for i in ids.tolist()]
+
+    def box_id(self, box):
+        if (isinstance(box, BoxTuple)):
+            return box.id
+
+        # narrow the sorted id range one coordinate at a time
+        lo, hi = 0, len(self.boxes)
+        for column in SORT_COLUMNS:
+            values = self.columns[column][lo:hi]
+            lo, hi = (lo + numpy.searchsorted(values, box[column], 'left'),
+                      lo + numpy.searchsorted(values, box[column], 'right'))
+        if (lo < hi):
+            return int(self.order[lo])
+        raise KeyError(box)
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+def compile_mesh(mesh):
+    """
+    Converts a dict mesh made by nm_meshbuilder into a CompactMesh
+
+    Args:
+        mesh: dict with "boxes" and "adj" entries keyed by box tuples
+
+    Returns:
+        The equivalent CompactMesh
+    """
+    boxes = list(mesh['boxes'])
+    ids = dict((box, i) for i, box in enumerate(boxes))
+    order = sorted(range(len(boxes)), key=lambda i: tuple(boxes[i][column] for column in SORT_COLUMNS))
+
+    integral = all(float(v).is_integer() for box in boxes for v in box)
+    box_array = numpy.array(boxes, dtype=numpy.int32 if integral else numpy.float64).reshape(-1, 4)
+
+    adj_indptr = numpy.zeros(len(boxes) + 1, dtype=numpy.int64)
+    adj_indices = []
+    adj_portals = []
+    for i, box in enumerate(boxes):
+        neighbors = mesh['adj'].get(box, [])
+        adj_indices.extend(ids[neighbor] for neighbor in neighbors)
+        adj_portals.extend(nm_pathfinder.find_portal(box, neighbor) for neighbor in neighbors)
+        adj_indptr[i + 1] = len(adj_indices)
+
+    components = nm_pathfinder.get_components(mesh)
+
+    index = nm_pathfinder.build_box_index({'boxes': boxes})
+    cell_size = index['cell_size']
+    cells = index['cells']
+    if (cells):
+        origin = (min(c[0] for c in cells), min(c[1] for c in cells))
+        shape = (max(c[0] for c in cells) - origin[0] + 1, max(c[1] for c in cells) - origin[1] + 1)
+    else:
+        origin, shape = (0, 0), (0, 0)
+
+    cell_indptr = numpy.zeros(shape[0] * shape[1] + 1, dtype=numpy.int64)
+    cell_indices = []
+    for cx in range(shape[0]):
+        for cy in range(shape[1]):
+            cell_indices.extend(cells.get((cx + origin[0], cy + origin[1]), []))
+            cell_indptr[cx * shape[1] + cy + 1] = len(cell_indices)
+
+    return CompactMesh({
+        'boxes': box_array,
+        'box_order': numpy.array(order, dtype=numpy.int32),
+        'adj_indptr': adj_indptr,
+        'adj_indices': numpy.array(adj_indices, dtype=numpy.int32),
+        'adj_portals': numpy.array(adj_portals, dtype=numpy.float64).reshape(-1, 4),
+        'components': numpy.array([components.get(box, 0) for box in boxes], dtype=numpy.int32),
+        'cell_indptr': cell_indptr,
+        'cell_indices': numpy.array(cell_indices, dtype=numpy.int32),
+        'grid': numpy.array([cell_size, origin[0], origin[1], shape[0], shape[1]], dtype=numpy.float64),
+    })
+
+
+def save_compact_mesh(mesh, dirname):
+    os.makedirs(dirname, exist_ok=True)
+    for name in ARRAYS:
+        numpy.save(os.path.join(dirname, name + '.npy'), mesh.arrays[name])
+
+
+def load_compact_mesh(dirname, mmap=True):
+    """
+    Loads a compact mesh directory written by save_compact_mesh
+
+    Args:
+        dirname: the .mesh.compact directory
+        mmap: map the arrays read-only instead of reading them into memory
+
+    Returns:
+        A CompactMesh over the stored arrays
+    """
+    mode = 'r' if mmap else None
+
+    # plain ndarray views over the maps; slicing a numpy.memmap is much slower
+    arrays = dict((name, numpy.asarray(numpy.load(os.path.join(dirname, name + '.npy'), mmap_mode=mode)))
+                  for name in ARRAYS)
+    return CompactMesh(arrays)
+
+
+def load_mesh(filename):
+    # accepts either the pickled dict mesh or a compact mesh directory
+    if (os.path.isdir(filename)):
+        return load_compact_mesh(filename)
+    with open(filename, 'rb') as f:
+        mesh = pickle.load(f)
+
+    # label components up front so no query pays for it
+    nm_pathfinder.get_components(mesh)
+    return mesh
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print("usage: %s map.mesh.pickle [...]" % sys.argv[0])
+        sys.exit(-1)
+
+    for filename in sys.argv[1:]:
+        with open(filename, 'rb') as f:
+            mesh = compile_mesh(pickle.load(f))
+
+        dirname = filename[:-len('.pickle')] if filename.endswith('.pickle') else filename
+        dirname += '.compact'
+        save_compact_mesh(mesh, dirname)
+
+        print("Wrote %s (%d boxes, %d bytes)." % (dirname, len(mesh.boxes), mesh.nbytes()))
@@ -0,0 +1,105 @@
+from math import inf
+
+import nm_pathfinder
+
+
+def build_distance_field(source_point, mesh):
+    """
+    Runs Dijkstra from source_point over the whole mesh, placing points on the
+    portals the same way the pathfinders do, so the path to any number of
+    destinations can be read off afterwards without searching again
+
+    Args:
+        source_point: the point every distance is measured from
+        mesh: pathway constraints the paths adhere to
+
+    Returns:
+        A dict with the source point and box, and the cost, backpointer and
+        entry point of every box reachable from the source; empty tables if
+        the source is off the mesh
+    """
+    field = {'source': source_point, 'box': None, 'cost': {}, 'prev': {}, 'points': {}}
+    src_box = nm_pathfinder.find_box(source_point, mesh)
+    if (src_box is None):
+        return field
+
+    portals = nm_pathfinder.get_portals(mesh)
+    cost = field['cost']
+    prev = field['prev']
+    points = field['points']
+    field['box'] = src_box
+    cost[src_box] = 0
+    prev[src_box] = None
+    points[src_box] = source_point
+
+    frontier = nm_pathfinder.Frontier()
+    frontier.push(0, src_box)
+    while (frontier):
+        p_cost, p_box = frontier.pop()
+        p_src = points[p_box]
+        for neighbor, portal in zip(mesh["adj"][p_box], portals[p_box]):
+            entrypoint = nm_pathfinder.clamp_to_portal(p_src, portal)
+            new_cost = p_cost + nm_pathfinder.euclidean(p_src, entrypoint)
+            if (neighbor not in cost or new_cost < cost[neighbor]):
+                cost[neighbor] = new_cost
+                prev[neighbor] = p_box
+                points[neighbor] = entrypoint
+                frontier.push(new_cost, neighbor)
+
+    return field
+
+
+def field_distance(field, destination_point, mesh):
+    """
+    The length of the path from the source of the field to destination_point,
+    inf if there is none
+    """
+    dst_box = nm_pathfinder.find_box(destination_point, mesh)
+    if (dst_box not in field['cost']):
+        return inf
+    return field['cost'][dst_box] + nm_pathfinder.euclidean(field['points'][dst_box], destination_point)
+
+
+def field_path(field, destination_point, mesh):
+    """
+    Follows the backpointers of the field from the box of destination_point
+    back to the source, in time proportional to the length of the path
+
+    Args:
+        field: a distance field from build_distance_field
+        destination_point: where the path ends
+        mesh: the mesh the field was built over
+
+    Returns:
+
+        A path (list of points) from the source of the field to destination_point if exists
+        A list of boxes the path passes through
+    """
+    source_point = field['source']
+    dst_box = nm_pathfinder.find_box(destination_point, mesh)
+    if (dst_box not in field['prev']):
+        print("No path!")
+        return [source_point, destination_point], [box for box in (field['box'], dst_box) if box is not None]
+
+    corridor = [dst_box]
+    while field['prev'][corridor[-1]] is not None:
+        corridor.append(field['prev'][corridor[-1]])
+    corridor.reverse()
+
+    if (dst_box == field['box']):
+        return [source_point, destination_point], corridor
+
+    path = nm_pathfinder.construct_path(dst_box, field['box'], field['prev'], field['points'], destination_point)
+    return path, corridor
+
+
+def field_path_from(field, start_point, mesh):
+    """
+    The path from start_point to the source of the field, for many agents
+    heading to one goal the field is built from the goal. Path lengths are
+    symmetric, so this is the path to start_point walked backwards.
+    """
+    path, corridor = field_path(field, start_point, mesh)
+    path.reverse()
+    corridor.reverse()
+    return path, corridor
@@ -0,0 +1,183 @@
+from math import inf
+from heapq import heappop, heappush
+
+import nm_pathfinder
+
+# side length of the square regions boxes are clustered into
+REGION_SIZE = 128
+
+
+def box_center(box):
+    return ((box[0] + box[1]) / 2, (box[2] + box[3]) / 2)
+
+
+def region_of(box, region_size):
+    x, y = box_center(box)
+    return (int(x // region_size), int(y // region_size))
+
+
+def box_distance(a, b):
+    return nm_pathfinder.euclidean(box_center(a), box_center(b))
+
+
+def local_search(start, region, regions, mesh, boxes):
+    """
+    Dijkstra over the boxes of one region, moving between box centers
+
+    Args:
+        start: the box to search from
+        region: the region the search may not leave
+        regions: mapping of every box to its region
+        mesh: pathway constraints the path adheres to
+        boxes: dict the expanded boxes are recorded in
+
+    Returns:
+        The cost and backpointer of every box of the region reachable from start
+    """
+    cost = {start: 0}
+    prev = {start: None}
+    frontier = [(0, start)]
+    while frontier:
+        p_cost, p_box = heappop(frontier)
+        if p_cost > cost[p_box]:
+            continue
+        boxes[p_box] = True
+        for neighbor in mesh["adj"][p_box]:
+            if regions[neighbor] != region:
+                continue
+            new_cost = p_cost + box_distance(p_box, neighbor)
+            if neighbor not in cost or new_cost < cost[neighbor]:
+                cost[neighbor] = new_cost
+                prev[neighbor] = p_box
+                heappush(frontier, (new_cost, neighbor))
+    return cost, prev
+
+
+def trace(prev, box):
+    # boxes from the search start to box
+    corridor = [box]
+    while prev[corridor[-1]] is not None:
+        corridor.append(prev[corridor[-1]])
+    corridor.reverse()
+    return corridor
+
+
+def build_hierarchy(mesh, region_size=REGION_SIZE):
+    """
+    Clusters the boxes into square regions and precomputes the abstract graph
+    over their entrances, the boxes with a neighbor in another region. Entrances
+    are linked to their neighbors across the region border and to every other
+    entrance of the same region they can reach without leaving it.
+
+    Args:
+        mesh: pathway constraints the path adheres to
+        region_size: side length of a region
+
+    Returns:
+        A dict with the region of every box, the entrances of every region and
+        the abstract graph, mapping an entrance to (entrance, cost, corridor)
+        links where corridor is the list of boxes the link passes through
+    """
+    regions = dict((box, region_of(box, region_size)) for box in mesh["adj"])
+    entrances = {}
+    graph = {}
+
+    for box, neighbors in mesh["adj"].items():
+        for neighbor in neighbors:
+            if regions[neighbor] != regions[box]:
+                graph.setdefault(box, []).append((neighbor, box_distance(box, neighbor), [box, neighbor]))
+        if box in graph:
+            entrances.setdefault(regions[box], []).append(box)
+
+    for region, doors in entrances.items():
+        for door in doors:
+            cost, prev = local_search(door, region, regions, mesh, {})
+            for other in doors:
+                if other != door and other in cost:
+                    graph[door].append((other, cost[other], trace(prev, other)))
+
+    return {'region_size': region_size, 'regions': regions, 'entrances': entrances, 'graph': graph}
+
+
+def get_hierarchy(mesh):
+    # built on first use and kept on the mesh like the point location grid
+    hierarchy = mesh.get("hierarchy")
+    if (hierarchy is None):
+        hierarchy = mesh["hierarchy"] = build_hierarchy(mesh)
+    return hierarchy
+
+
+def hierarchical_find_path(source_point, destination_point, mesh):
+    """
+    Searches for a path from source_point to destination_point by first
+    searching the abstract graph of region entrances, then expanding each
+    abstract link into the corridor of boxes it stands for. Queries within one
+    region go to astar_find_path directly.
+
+    Args:
+        source_point: starting point of the pathfinder
+        destination_point: the ultimate goal the pathfinder must reach
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+
+        A path (list of points) from source_point to destination_point if exists
+        A list of boxes explored by the algorithm
+    """
+    hierarchy = get_hierarchy(mesh)
+    regions = hierarchy["regions"]
+    src_box = nm_pathfinder.find_box(source_point, mesh)
+    dst_box = nm_pathfinder.find_box(destination_point, mesh)
+
+    # unreachable pairs are answered by astar_find_path without searching
+    if (not nm_pathfinder.connected(src_box, dst_box, mesh) or src_box not in regions
+            or dst_box not in regions or regions[src_box] == regions[dst_box]):
+        return nm_pathfinder.astar_find_path(source_point, destination_point, mesh)
+
+    boxes = {}
+    src_region, dst_region = regions[src_box], regions[dst_box]
+
+    # hook both endpoints into the abstract graph through their own region
+    src_cost, src_prev = local_search(src_box, src_region, regions, mesh, boxes)
+    dst_cost, dst_prev = local_search(dst_box, dst_region, regions, mesh, boxes)
+
+    def links(node):
+        if node == src_box:
+            for door in hierarchy["entrances"].get(src_region, []):
+                if door in src_cost:
+                    yield door, src_cost[door], trace(src_prev, door)
+        for link in hierarchy["graph"].get(node, []):
+            yield link
+        if node in dst_cost and regions[node] == dst_region:
+            yield dst_box, dst_cost[node], list(reversed(trace(dst_prev, node)))
+
+    cost = {src_box: 0}
+    prev = {src_box: None}
+    frontier = [(box_distance(src_box, dst_box), src_box)]
+    found = False
+    while frontier:
+        p_priority, p_box = heappop(frontier)
+        boxes[p_box] = True
+        if p_box == dst_box:
+            found = True
+            break
+        for neighbor, link_cost, corridor in links(p_box):
+            new_cost = cost[p_box] + link_cost
+            if new_cost < cost.get(neighbor, inf):
+                cost[neighbor] = new_cost
+                prev[neighbor] = (p_box, corridor)
+                heappush(frontier, (new_cost + box_distance(neighbor, dst_box), neighbor))
+
+    if not found:
+        print("No path!")
+        return [source_point, destination_point], boxes.keys()
+
+    # stitch the corridors of the abstract links back into one
+    corridor = [dst_box]
+    node = dst_box
+    while prev[node] is not None:
+        node, segment = prev[node]
+        corridor.extend(reversed(segment[:-1]))
+    corridor.reverse()
+
+    return nm_pathfinder.corridor_path(source_point, destination_point, corridor, mesh), boxes.keys()
@@ -1,10 +1,13 @@
 import sys
 import random
-import pickle
+from timeit import default_timer as time
 import traceback
 import tkinter
 
 import nm_pathfinder
+import nm_compactmesh
+import nm_pathservice
+import nm_render
 
 if len(sys.argv) != 4:
     print("usage: %s map.gif map.mesh.pickle subsample_factor" % sys.argv[0])
@@ -13,8 +16,11 @@ if len(sys.argv) != 4:
 _, MAP_FILENAME, MESH_FILENAME, SUBSAMPLE = sys.argv
 SUBSAMPLE = int(SUBSAMPLE)
 
-with open(MESH_FILENAME, 'rb') as f:
-  mesh = pickle.load(f)
+mesh = nm_compactmesh.load_mesh(MESH_FILENAME)
+service = nm_pathservice.PathService(mesh, nm_pathfinder.find_path)
+
+# how often the explored boxes of a running query are drawn, in ms
+POLL_INTERVAL = 30
 
 master = tkinter.Tk()
 
@@ -26,6 +32,13 @@ SMALL_WIDTH, SMALL_HEIGHT = small_image.width(), small_image.height()
 canvas = tkinter.Canvas(master, width=SMALL_WIDTH, height=SMALL_HEIGHT)
 canvas.pack()
 
+# the map with the explored boxes drawn in, shown as one canvas image; the
+# path and the end points stay canvas items on top of it
+base_raster = nm_render.load_rgb(MAP_FILENAME, SUBSAMPLE)
+raster = base_raster.copy()
+overlay_image = tkinter.PhotoImage(data=nm_render.ppm_data(raster), format='PPM')
+overlay = canvas.create_image((0,0), anchor=tkinter.NW, image=overlay_image)
+
 
 def shrink(values):
     return [v/SUBSAMPLE for v in values]
@@ -34,40 +47,98 @@ source_point = None
 destination_point = None
 visited_boxes = []
 path = []
+query = None
+drawn = 0
+
+
+def show_frame_time(start):
+    master.title("%s  %.1f ms" % (MAP_FILENAME, (time() - start) * 1e3))
+
 
+def update_overlay():
+    global overlay_image
+    overlay_image = tkinter.PhotoImage(data=nm_render.ppm_data(raster), format='PPM')
+    canvas.itemconfig(overlay, image=overlay_image)
 
-def redraw():
 
-    canvas.delete(tkinter.ALL)
-    canvas.create_image((0,0), anchor=tkinter.NW, image=small_image)
+def draw_boxes(boxes, clear=False):
+    if clear:
+        raster[:] = base_raster
+    nm_render.outline_boxes(raster, boxes, SUBSAMPLE)
+    update_overlay()
 
-    for box in visited_boxes:
-        x1,x2,y1,y2 = shrink(box)
-        canvas.create_rectangle(y1,x1,y2,x2,outline='pink')
+
+def draw_marks():
+
+    canvas.delete('marks')
 
     for i in range(len(path) - 1):
         x1, y1 = shrink(path[i])
         x2, y2 = shrink(path[i + 1])
-        canvas.create_line(y1,x1,y2,x2,width=2.0,fill='red')
+        canvas.create_line(y1,x1,y2,x2,width=2.0,fill='red',tags='marks')
 
     if source_point:
         x,y = shrink(source_point)
-        canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red')
+        canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red',tags='marks')
 
     if destination_point:
         x,y = shrink(destination_point)
-        canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red')
+        canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red',tags='marks')
+
+
+def redraw(boxes_changed=True):
+
+    start = time()
+    if boxes_changed:
+        draw_boxes(visited_boxes, clear=True)
+    draw_marks()
+    show_frame_time(start)
+
+
+def poll():
+
+    global query, drawn, visited_boxes, path, destination_point
+
+    if query is None:
+        return
+
+    start = time()
+    done = query.done.is_set()
+    explored = query.explored.order
+    end = len(explored)
+    if end > drawn:
+        draw_boxes(explored[drawn:end])
+        show_frame_time(start)
+    drawn = end
+
+    if not done:
+        master.after(POLL_INTERVAL, poll)
+        return
+
+    if query.error is not None:
+        destination_point = None
+    else:
+        visited_boxes = list(explored)
+        path = query.path
+    query = None
+    # the boxes are all drawn already, only the path is new
+    redraw(boxes_changed=False)
 
 
 def on_click(event):
 
-    global source_point, destination_point, visited_boxes, path
+    global source_point, destination_point, visited_boxes, path, query, drawn
 
+    boxes_changed = False
     if source_point and destination_point:
+        # a new click drops the query still running, if any
+        service.cancel()
+        query = None
         source_point = None
         destination_point = None
         visited_boxes = []
         path = []
+        boxes_changed = True
 
     elif not source_point:
         source_point = event.y*SUBSAMPLE, event.x*SUBSAMPLE
@@ -75,13 +146,15 @@ def on_click(event):
     else:
         destination_point = event.y*SUBSAMPLE, event.x*SUBSAMPLE
         try:
-            path, visited_boxes = nm_pathfinder.find_path(source_point, destination_point, mesh)
+            query = service.submit(source_point, destination_point)
+            drawn = 0
+            master.after(POLL_INTERVAL, poll)
 
         except:
             destination_point = None
             traceback.print_exc()
 
-    redraw()
+    redraw(boxes_changed)
 
 canvas.bind('<Button-1>', on_click)
 
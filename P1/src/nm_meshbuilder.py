@@ -1,149 +1,475 @@
 import collections
+import multiprocessing
 import pickle
 import sys
 import random
+from timeit import default_timer as time
 
 from matplotlib.pyplot import imread, imsave
 import numpy
 from numpy import zeros_like
 
+import nm_pathfinder
 
-def build_mesh(image, min_feature_size):
-    def scan(box):
 
-        x1, x2, y1, y2 = box
-        area = (x2 - x1) * (y2 - y1)
+def integral_images(image):
+    """
+    Builds summed-area tables counting the white and the black pixels of the
+    image, padded with a leading row and column of zeros
 
-        if area < min_feature_size or (image[x1:x2, y1:y2] == 255).all() or (image[x1:x2, y1:y2] == 0).all():
+    Args:
+        image: 2D array of pixel values
 
-            # this box is simple enough to handle in one node
-            if (image[x1:x2, y1:y2] == 255).all():
-                return [box], []
-            else:
-                return [], []
+    Returns:
+        The (white, black) tables
+    """
+    # counts never exceed the pixel count, so 32 bits do for all but huge images
+    dtype = numpy.int32 if image.size < 2 ** 31 else numpy.int64
+    tables = []
+    for value in (255, 0):
+        table = numpy.zeros((image.shape[0] + 1, image.shape[1] + 1), dtype=dtype)
+        inner = table[1:, 1:]
+        numpy.cumsum(image == value, axis=0, dtype=dtype, out=inner)
+        numpy.cumsum(inner, axis=1, out=inner)
+        tables.append(table)
+    return tuple(tables)
 
-        else:
 
-            # recursively split this big box on the longest dimension
-            if x2 - x1 > y2 - y1:
+def count_in_box(table, box):
+    x1, x2, y1, y2 = box
+    return int(table[x2, y2] - table[x1, y2] - table[x2, y1] + table[x1, y1])
 
-                cut = int(x1 + (x2 - x1) / 2 + 1)
-                first_box = (x1, cut, y1, y2)
-                second_box = (cut, x2, y1, y2)
 
-                def rank(b): return (b[2], b[3])
+def split_box(box):
+    """
+    Splits a box in half on its longest dimension
 
-                def first_touch(b): return b[1] == cut
+    Returns:
+        The two halves, the axis of the cut (0 for x, 1 for y) and the cut line
+    """
+    x1, x2, y1, y2 = box
+    if x2 - x1 > y2 - y1:
+        cut = int(x1 + (x2 - x1) / 2 + 1)
+        return (x1, cut, y1, y2), (cut, x2, y1, y2), 0, cut
+    else:
+        cut = int(y1 + (y2 - y1) / 2 + 1)
+        return (x1, x2, y1, cut), (x1, x2, cut, y2), 1, cut
 
-                def second_touch(b): return b[0] == cut
 
-            else:
+def merge_halves(first, second, axis, cut):
+    """
+    Joins the boxes and edges built for the two halves of a split box, merging
+    boxes that meet with the same extent along the cut line and adding edges
+    between the ones that only partly meet
 
-                cut = int(y1 + (y2 - y1) / 2 + 1)
-                first_box = (x1, x2, y1, cut)
-                second_box = (x1, x2, cut, y2)
+    Args:
+        first: (boxes, edges) of the half before the cut
+        second: (boxes, edges) of the half after the cut
+        axis: 0 if the cut is along x, 1 if along y
+        cut: the coordinate of the cut line
 
-                def rank(b): return (b[0], b[1])
+    Returns:
+        The (boxes, edges) of the whole box
+    """
+    first_boxes, first_edges = first
+    second_boxes, second_edges = second
 
-                def first_touch(b): return b[3] == cut
+    if axis == 0:
+        def rank(b): return (b[2], b[3])
 
-                def second_touch(b): return b[2] == cut
+        def first_touch(b): return b[1] == cut
 
-            first_boxes, first_edges = scan(first_box)
-            second_boxes, second_edges = scan(second_box)
+        def second_touch(b): return b[0] == cut
 
-            my_boxes = []
-            my_edges = []
+    else:
+        def rank(b): return (b[0], b[1])
 
-            my_boxes.extend([fb for fb in first_boxes if not first_touch(fb)])
-            my_boxes.extend(
-                [sb for sb in second_boxes if not second_touch(sb)])
+        def first_touch(b): return b[3] == cut
 
-            first_touches = sorted(filter(first_touch, first_boxes), key=rank)
-            second_touches = sorted(
-                filter(second_touch, second_boxes), key=rank)
+        def second_touch(b): return b[2] == cut
 
-            first_merges = {}
-            second_merges = {}
+    my_boxes = []
+    my_edges = []
 
-            while first_touches and second_touches:
+    my_boxes.extend([fb for fb in first_boxes if not first_touch(fb)])
+    my_boxes.extend(
+        [sb for sb in second_boxes if not second_touch(sb)])
 
-                f, s = first_touches[0], second_touches[0]
-                rf, rs = rank(f), rank(s)
+    first_touches = sorted(filter(first_touch, first_boxes), key=rank)
+    second_touches = sorted(
+        filter(second_touch, second_boxes), key=rank)
 
-                if rf == rs:
+    first_merges = {}
+    second_merges = {}
 
-                    first_touches.pop(0)
-                    second_touches.pop(0)
-                    merged = (f[0], s[1], f[2], s[3])
-                    first_merges[f] = merged
-                    second_merges[s] = merged
-                    my_boxes.append(merged)
+    # walk both sorted lists with cursors rather than popping their heads
+    i, j = 0, 0
+    while i < len(first_touches) and j < len(second_touches):
 
-                elif rf[1] < rs[1]:
+        f, s = first_touches[i], second_touches[j]
+        rf, rs = rank(f), rank(s)
 
-                    my_boxes.append(first_touches.pop(0))
-                    if rf[1] >= rs[0]:
-                        my_edges.append((f, s))
+        if rf == rs:
 
-                elif rf[1] > rs[1]:
+            i += 1
+            j += 1
+            merged = (f[0], s[1], f[2], s[3])
+            first_merges[f] = merged
+            second_merges[s] = merged
+            my_boxes.append(merged)
 
-                    my_boxes.append(second_touches.pop(0))
-                    if rf[0] <= rs[1]:
-                        my_edges.append((f, s))
+        elif rf[1] < rs[1]:
 
-                else:
+            my_boxes.append(f)
+            i += 1
+            if rf[1] >= rs[0]:
+                my_edges.append((f, s))
 
-                    my_boxes.append(first_touches.pop(0))
-                    my_boxes.append(second_touches.pop(0))
-                    my_edges.append((f, s))
+        elif rf[1] > rs[1]:
 
-            my_boxes.extend(first_touches)
-            my_boxes.extend(second_touches)
+            my_boxes.append(s)
+            j += 1
+            if rf[0] <= rs[1]:
+                my_edges.append((f, s))
 
-            for a, b in first_edges:
-                my_edges.append(
-                    (first_merges.get(a, a), first_merges.get(b, b)))
+        else:
 
-            for a, b in second_edges:
-                my_edges.append(
-                    (second_merges.get(a, a), second_merges.get(b, b)))
+            my_boxes.append(f)
+            my_boxes.append(s)
+            i += 1
+            j += 1
+            my_edges.append((f, s))
+
+    my_boxes.extend(first_touches[i:])
+    my_boxes.extend(second_touches[j:])
+
+    for a, b in first_edges:
+        my_edges.append(
+            (first_merges.get(a, a), first_merges.get(b, b)))
+
+    for a, b in second_edges:
+        my_edges.append(
+            (second_merges.get(a, a), second_merges.get(b, b)))
+
+    return my_boxes, my_edges
+
+
+def classify_box(box, white_count, black_count, min_feature_size):
+    """
+    Decides whether a box is simple enough to become one node or must be split
+
+    Args:
+        box: the (x1, x2, y1, y2) region
+        white_count: number of white pixels in the region
+        black_count: number of black pixels in the region
+        min_feature_size: area below which a box is no longer split
+
+    Returns:
+        (result, None) for a simple box, result being its (boxes, edges),
+        or (None, split) with the split_box of a box that must be split
+    """
+    x1, x2, y1, y2 = box
+    area = (x2 - x1) * (y2 - y1)
+    all_white = white_count == area
+
+    simple = area < min_feature_size or all_white or black_count == area
+    if not simple:
+        split = split_box(box)
+
+        # boxes two pixels wide can not be split any further, the first
+        # half of the cut would be the box itself
+        if split[0] != box:
+            return None, split
+
+    # this box is simple enough to handle in one node
+    return ([box], []) if all_white else ([], []), None
+
+
+def scan(box, tables, min_feature_size, cache=None, cache_area=0):
+    """
+    Builds the boxes and edges covering the white pixels inside box. The box is
+    split in half until each piece is all white, all black or smaller than
+    min_feature_size, and the pieces are merged back up in the same order a
+    recursive build would, using an explicit stack.
+
+    Args:
+        box: the (x1, x2, y1, y2) region of the image to cover
+        tables: the (white, black) tables from integral_images
+        min_feature_size: area below which a box is no longer split
+        cache: optional dict of split boxes to their (boxes, edges), reused
+            instead of rescanning and filled in as boxes are merged
+        cache_area: smallest split box area worth keeping in the cache
+
+    Returns:
+        The (boxes, edges) covering the region
+    """
+    white, black = tables
+
+    # frames are (box, None) before the box is looked at and
+    # (box, split) once both of its halves have been queued
+    stack = [(box, None)]
+    results = []
+
+    while stack:
+        box, split = stack.pop()
+
+        if split is not None:
+            second = results.pop()
+            first = results.pop()
+            results.append(merge_halves(first, second, split[2], split[3]))
+            if cache is not None and (box[1] - box[0]) * (box[3] - box[2]) >= cache_area:
+                cache[box] = results[-1]
+            continue
+
+        if cache is not None and box in cache:
+            results.append(cache[box])
+            continue
+
+        result, split = classify_box(box, count_in_box(white, box), count_in_box(black, box),
+                                     min_feature_size)
+        if result is not None:
+            results.append(result)
+        else:
+            stack.append((box, split))
+            stack.append((split[1], None))
+            stack.append((split[0], None))
+
+    return results[0]
+
+
+def scan_levels(box, tables, sizes):
+    """
+    Runs scan for several min_feature_size values in one walk of the split
+    tree. The tree for a larger size is the tree for a smaller one cut off
+    higher up, so the finest tree is walked once and every node is merged
+    for each size it is not already a leaf at. Levels whose halves are the
+    same share one merge.
+
+    Args:
+        box: the (x1, x2, y1, y2) region of the image to cover
+        tables: the (white, black) tables from integral_images
+        sizes: min_feature_size of every level, in increasing order
+
+    Returns:
+        The (boxes, edges) of every level, in the order of sizes
+    """
+    white, black = tables
+    empty = ([], [])
+
+    stack = [(box, None)]
+    results = []
+
+    while stack:
+        box, split = stack.pop()
+
+        if split is not None:
+            second = results.pop()
+            first = results.pop()
+            area = (box[1] - box[0]) * (box[3] - box[2])
+            merged = {}
+            levels = []
+            for k, min_feature_size in enumerate(sizes):
+                # too small to split at this size, and neither all white nor all black
+                if area < min_feature_size:
+                    levels.append(empty)
+                    continue
+                key = (id(first[k]), id(second[k]))
+                if key not in merged:
+                    merged[key] = merge_halves(first[k], second[k], split[2], split[3])
+                levels.append(merged[key])
+            results.append(levels)
+            continue
+
+        result, split = classify_box(box, count_in_box(white, box), count_in_box(black, box), sizes[0])
+        if result is not None:
+            results.append([result] * len(sizes))
+        else:
+            stack.append((box, split))
+            stack.append((split[1], None))
+            stack.append((split[0], None))
 
-            return my_boxes, my_edges
+    return results[0]
 
-            # end of scan
 
-    boxes, edges = scan((0, image.shape[0], 0, image.shape[1]))
+def scan_tile(job):
+    """
+    Runs scan over one tile of the image in a worker process. The split rule is
+    unchanged by integer shifts, so the tile is scanned in its own coordinates
+    and the results moved back into place.
 
+    Args:
+        job: (tile pixels, (x1, y1) origin of the tile, min_feature_size)
+
+    Returns:
+        The (boxes, edges) of the tile in image coordinates
+    """
+    tile, (ox, oy), min_feature_size = job
+    boxes, edges = scan((0, tile.shape[0], 0, tile.shape[1]), integral_images(tile), min_feature_size)
+
+    def shift(b): return (b[0] + ox, b[1] + ox, b[2] + oy, b[3] + oy)
+
+    return [shift(b) for b in boxes], [(shift(a), shift(b)) for a, b in edges]
+
+
+def mesh_from_edges(edges):
     adj = collections.defaultdict(list)
     for a, b in edges:
         adj[a].append(b)
         adj[b].append(a)
 
     mesh = {'boxes': list(adj.keys()), 'adj': dict(adj)}
+    mesh['portals'] = nm_pathfinder.build_portals(mesh)
+    mesh['components'] = nm_pathfinder.build_components(mesh)
 
     return mesh
 
 
+def build_mesh(image, min_feature_size):
+    tables = integral_images(image)
+    boxes, edges = scan((0, image.shape[0], 0, image.shape[1]), tables, min_feature_size)
+    return mesh_from_edges(edges)
+
+
+def build_pyramid(image, sizes):
+    """
+    Builds meshes of the same image at several feature sizes in one pass, and
+    links every box to the box holding its center one level coarser
+
+    Args:
+        image: 2D array of pixel values
+        sizes: min_feature_size of every level
+
+    Returns:
+        A dict with the sizes in increasing order, the mesh of every level,
+        parents[k] mapping each box of level k to its box on level k + 1 (None
+        where that level has no open space) and children[k] mapping each box
+        of level k + 1 to the boxes of level k under it
+    """
+    sizes = sorted(sizes)
+    tables = integral_images(image)
+    levels = [mesh_from_edges(edges)
+              for boxes, edges in scan_levels((0, image.shape[0], 0, image.shape[1]), tables, sizes)]
+
+    parents = []
+    children = []
+    for fine, coarse in zip(levels, levels[1:]):
+        parent = {}
+        child = dict((box, []) for box in coarse['boxes'])
+        for box in fine['boxes']:
+            center = ((box[0] + box[1]) // 2, (box[2] + box[3]) // 2)
+            parent[box] = nm_pathfinder.find_box(center, coarse)
+            if parent[box] is not None:
+                child[parent[box]].append(box)
+        parents.append(parent)
+        children.append(child)
+
+    return {'sizes': sizes, 'levels': levels, 'parents': parents, 'children': children}
+
+
+def build_mesh_parallel(image, min_feature_size, processes=None, tiles=None):
+    """
+    Builds the same mesh as build_mesh with the work spread over a process pool.
+    The top of the split tree is expanded here until there are enough tiles,
+    each tile is scanned by a worker, and the tile results are merged back up
+    the tree with merge_halves exactly as the serial scan would.
+
+    Args:
+        image: 2D array of pixel values
+        min_feature_size: area below which a box is no longer split
+        processes: number of worker processes, defaults to the CPU count
+        tiles: number of tiles to hand out, defaults to four per process
+
+    Returns:
+        The mesh, identical to the one build_mesh returns
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if tiles is None:
+        tiles = 4 * processes
+
+    # nodes are [box, split, children, result]; children are always created
+    # after their parent, so folding them in reverse merges bottom up
+    nodes = [[(0, image.shape[0], 0, image.shape[1]), None, None, None]]
+    pending = [0]
+
+    while pending and len(pending) < tiles:
+        # split the largest pending region next to keep the tiles even
+        pending.sort(key=lambda n: (nodes[n][0][1] - nodes[n][0][0]) * (nodes[n][0][3] - nodes[n][0][2]))
+        n = pending.pop()
+        x1, x2, y1, y2 = box = nodes[n][0]
+        pixels = image[x1:x2, y1:y2]
+        result, split = classify_box(box, int((pixels == 255).sum()), int((pixels == 0).sum()),
+                                     min_feature_size)
+        if result is not None:
+            nodes[n][3] = result
+            continue
+
+        nodes[n][1] = split
+        nodes[n][2] = (len(nodes), len(nodes) + 1)
+        for half in split[:2]:
+            pending.append(len(nodes))
+            nodes.append([half, None, None, None])
+
+    jobs = [(image[nodes[n][0][0]:nodes[n][0][1], nodes[n][0][2]:nodes[n][0][3]],
+             (nodes[n][0][0], nodes[n][0][2]), min_feature_size) for n in pending]
+    with multiprocessing.Pool(processes) as pool:
+        for n, result in zip(pending, pool.map(scan_tile, jobs)):
+            nodes[n][3] = result
+
+    for node in reversed(nodes):
+        if node[2] is not None:
+            first, second = node[2]
+            node[3] = merge_halves(nodes[first][3], nodes[second][3], node[1][2], node[1][3])
+
+    boxes, edges = nodes[0][3]
+    return mesh_from_edges(edges)
+
+
+def load_image(filename):
+    img = (imread(filename) * 255).astype(dtype=numpy.uint8)
+    if len(img.shape) > 2:
+        img = img[:, :, 0]
+    return img
+
+
 if __name__ == '__main__':
 
     min_feature_size = 16
+    processes = 1
     filename = None
 
     if len(sys.argv) == 2:
         filename = sys.argv[1]
-    elif len(sys.argv) == 3:
+    elif len(sys.argv) in (3, 4):
         filename = sys.argv[1]
-        min_feature_size = int(sys.argv[2])
+        sizes = [int(size) for size in sys.argv[2].split(',')]
+        min_feature_size = sizes[0]
+        if len(sys.argv) == 4:
+            processes = int(sys.argv[3])
     else:
-        print("usage: %s map_filename min_feature_size" % sys.argv[0])
+        print("usage: %s map_filename min_feature_size[,min_feature_size...] [processes]" % sys.argv[0])
         sys.exit(-1)
 
-    img = (imread(filename) * 255).astype(dtype=numpy.uint8)
-    if len(img.shape) > 2:
-        img = img[:, :, 0]
+    img = load_image(filename)
+
+    if len(sys.argv) > 2 and len(sizes) > 1:
+        start = time()
+        pyramid = build_pyramid(img, sizes)
+        elapsed = time() - start
 
-    mesh = build_mesh(img, min_feature_size)
+        with open(filename + '.pyramid.pickle', 'wb') as f:
+            pickle.dump(pyramid, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        print("Built a pyramid with %s boxes in %.3f seconds."
+              % (', '.join(str(len(mesh['boxes'])) for mesh in pyramid['levels']), elapsed))
+        sys.exit(0)
+
+    start = time()
+    if processes > 1:
+        mesh = build_mesh_parallel(img, min_feature_size, processes)
+    else:
+        mesh = build_mesh(img, min_feature_size)
+    elapsed = time() - start
 
     print(type(mesh))
     print(mesh.keys())
@@ -157,4 +483,4 @@ if __name__ == '__main__':
 
     imsave(filename + '.mesh.png', atlas)
 
-    print("Built a mesh with %d boxes." % len(mesh['boxes']))
+    print("Built a mesh with %d boxes in %.3f seconds." % (len(mesh['boxes']), elapsed))
@@ -0,0 +1,130 @@
+import collections
+
+import numpy
+
+import nm_pathfinder
+import nm_meshbuilder
+
+# split boxes smaller than this are rescanned instead of cached
+CACHE_AREA = 1024
+
+
+def overlaps(box, rect):
+    return box[0] < rect[1] and rect[0] < box[1] and box[2] < rect[3] and rect[2] < box[3]
+
+
+def patch_integral_image(table, mask, rect):
+    """
+    Updates a summed-area table in place after the pixels inside rect changed,
+    without summing the rest of the image again
+
+    Args:
+        table: padded table as built by nm_meshbuilder.integral_images
+        mask: boolean array of the pixels inside rect that are now counted
+        rect: the (x1, x2, y1, y2) rectangle that changed
+    """
+    x1, x2, y1, y2 = rect
+    old = numpy.diff(numpy.diff(table[x1:x2 + 1, y1:y2 + 1], axis=0), axis=1)
+    delta = (mask.astype(table.dtype) - old).cumsum(axis=0, dtype=table.dtype).cumsum(axis=1, dtype=table.dtype)
+    table[x1 + 1:x2 + 1, y1 + 1:y2 + 1] += delta
+    table[x2 + 1:, y1 + 1:y2 + 1] += delta[-1:, :]
+    table[x1 + 1:x2 + 1, y2 + 1:] += delta[:, -1:]
+    table[x2 + 1:, y2 + 1:] += delta[-1, -1]
+
+
+class MeshUpdater(object):
+    """ Keeps a mesh in step with edits to its map image without rebuilding it.
+
+    The results of the split tree are cached per split box, so after an edit
+    only the boxes overlapping the dirty rectangle are rescanned; everything
+    above them is re-merged from cached halves. The new boxes and edges are
+    then patched into the existing mesh dict in place.
+    """
+
+    def __init__(self, image, min_feature_size, cache_area=CACHE_AREA):
+        """
+        Args:
+            image:              2D array of pixel values, edited in place by the caller.
+            min_feature_size:   Area below which a box is no longer split.
+            cache_area:         Smallest split box area kept in the cache.
+        """
+        self.image = image
+        self.min_feature_size = min_feature_size
+        self.cache_area = cache_area
+        self.cache = {}
+        self.tables = nm_meshbuilder.integral_images(image)
+        self.caches = []    # PathCache objects to invalidate on updates
+
+        boxes, edges = self.scan()
+        self.mesh = nm_meshbuilder.mesh_from_edges(edges)
+
+    def scan(self):
+        root = (0, self.image.shape[0], 0, self.image.shape[1])
+        return nm_meshbuilder.scan(root, self.tables, self.min_feature_size, self.cache, self.cache_area)
+
+    def paint(self, rect, value):
+        """
+        Fills a rectangle of the image, 0 for an obstacle or 255 for open
+        space, and updates the mesh to match
+        """
+        x1, x2, y1, y2 = rect
+        self.image[x1:x2, y1:y2] = value
+        return self.update(rect)
+
+    def update(self, rect):
+        """
+        Brings the mesh up to date after the pixels inside rect have changed
+
+        Args:
+            rect: the dirty (x1, x2, y1, y2) rectangle of the image
+
+        Returns:
+            The (removed, added) lists of boxes
+        """
+        rect = (max(rect[0], 0), min(rect[1], self.image.shape[0]),
+                max(rect[2], 0), min(rect[3], self.image.shape[1]))
+        x1, x2, y1, y2 = rect
+        if x1 >= x2 or y1 >= y2:
+            return [], []
+        pixels = self.image[x1:x2, y1:y2]
+        for table, value in zip(self.tables, (255, 0)):
+            patch_integral_image(table, pixels == value, rect)
+
+        for box in [box for box in self.cache if overlaps(box, rect)]:
+            del self.cache[box]
+
+        boxes, edges = self.scan()
+
+        adj = collections.defaultdict(list)
+        for a, b in edges:
+            adj[a].append(b)
+            adj[b].append(a)
+
+        mesh = self.mesh
+        removed = [box for box in mesh['adj'] if box not in adj]
+        added = [box for box in adj if box not in mesh['adj']]
+
+        # boxes whose neighbors changed get new adjacency and portals
+        changed = [box for box, neighbors in adj.items()
+                   if box not in mesh['adj'] or set(neighbors) != set(mesh['adj'][box])]
+
+        portals = nm_pathfinder.get_portals(mesh)
+        for box in removed:
+            del mesh['adj'][box]
+            del portals[box]
+        for box in changed:
+            mesh['adj'][box] = adj[box]
+            portals[box] = [nm_pathfinder.find_portal(box, neighbor) for neighbor in adj[box]]
+
+        gone = set(removed)
+        mesh['boxes'][:] = [box for box in mesh['boxes'] if box not in gone] + added
+
+        # tables indexed over the whole mesh are rebuilt on their next use
+        if (removed or added):
+            for key in ('index', 'components', 'hierarchy'):
+                mesh.pop(key, None)
+
+        for cache in self.caches:
+            cache.invalidate(removed + added)
+
+        return removed, added
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import random
+import contextlib
+from timeit import default_timer as time
+
+import nm_pathfinder
+import nm_hierarchy
+import nm_benchmark
+
+PATHFINDERS = dict(
+    find_path=nm_pathfinder.find_path,
+    astar_find_path=nm_pathfinder.astar_find_path,
+    hierarchical_find_path=nm_hierarchy.hierarchical_find_path,
+    smooth_find_path=nm_pathfinder.smooth_find_path,
+)
+
+QUERIES = 500
+SEED = 146
+
+# a p50 this much slower than the baseline is reported as a regression
+REGRESSION = 1.10
+
+# the pathfinder the paths and expansions of the others are compared with, query by query
+REFERENCE = 'astar_find_path'
+
+
+def random_point_in(box, rng):
+    return (rng.randint(int(box[0]), int(box[1])), rng.randint(int(box[2]), int(box[3])))
+
+
+def random_pairs(mesh, count, rng, attempts=100):
+    """
+    Draws source and destination points inside the boxes of the mesh, keeping
+    only pairs that have a path between them
+
+    Returns:
+        A list of at most count (source_point, destination_point) pairs
+    """
+    boxes = mesh['boxes']
+    pairs = []
+    for _ in range(count * attempts):
+        if len(pairs) == count:
+            break
+        src, dst = random_point_in(rng.choice(boxes), rng), random_point_in(rng.choice(boxes), rng)
+        src_box, dst_box = nm_pathfinder.find_box(src, mesh), nm_pathfinder.find_box(dst, mesh)
+        if nm_pathfinder.connected(src_box, dst_box, mesh):
+            pairs.append((src, dst))
+    return pairs
+
+
+def percentile(values, q):
+    # nearest rank, so the result is always one of the measured values
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def bench_pathfinder(pathfinder, pairs, mesh, reference=None):
+    """
+    Runs every query through one pathfinder
+
+    Args:
+        pathfinder: a function with the find_path signature
+        pairs: list of (source_point, destination_point) queries
+        mesh: the mesh the queries run over
+        reference: optional per query (length, expanded) of another pathfinder
+
+    Returns:
+        A dict with the p50, p95 and mean latency in ms and the mean number of
+        expanded boxes, path length and frontier operations per query, and with
+        a reference, the share of queries whose path is longer and whose
+        search expanded more boxes than the reference's. Also the per query
+        (length, expanded), to be used as a reference.
+    """
+    latencies = []
+    per_query = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # the first query builds the tables kept on the mesh, so it is not timed
+        pathfinder(pairs[0][0], pairs[0][1], mesh)
+        nm_pathfinder.reset_search_stats()
+        for src, dst in pairs:
+            start = time()
+            path, boxes = pathfinder(src, dst, mesh)
+            latencies.append(time() - start)
+            per_query.append((sum(nm_pathfinder.euclidean(a, b) for a, b in zip(path, path[1:])), len(boxes)))
+
+    results = {
+        'p50_ms': percentile(latencies, 50) * 1e3,
+        'p95_ms': percentile(latencies, 95) * 1e3,
+        'mean_ms': sum(latencies) / len(latencies) * 1e3,
+        'expanded': sum(expanded for _, expanded in per_query) / float(len(pairs)),
+        'length': sum(length for length, _ in per_query) / float(len(pairs)),
+    }
+    for key in ('pushes', 'pops', 'stale', 'reexpansions'):
+        results[key] = nm_pathfinder.search_stats[key] / float(len(pairs))
+    if reference is not None:
+        compared = list(zip(per_query, reference))
+        results['longer'] = sum(mine[0] > ref[0] + 1e-6 for mine, ref in compared) / float(len(pairs))
+        results['more_expanded'] = sum(mine[1] > ref[1] for mine, ref in compared) / float(len(pairs))
+    return results, per_query
+
+
+def bench_pathfinders(meshes, pathfinders=PATHFINDERS, queries=QUERIES, seed=SEED):
+    """
+    Times each pathfinder on the same seeded queries over every mesh
+
+    Args:
+        meshes: list of (name, mesh) pairs
+        pathfinders: dict of name to a function with the find_path signature
+        queries: number of source and destination pairs drawn per mesh
+        seed: seed of the query generator
+
+    Returns:
+        A dict of the settings and, per mesh, the box count, query count and
+        the results of bench_pathfinder for every pathfinder, compared with
+        REFERENCE when it is one of them
+    """
+    results = {'seed': seed, 'queries': queries, 'meshes': {}}
+    for name, mesh in meshes:
+        pairs = random_pairs(mesh, queries, random.Random(seed))
+        if not pairs:
+            continue
+        reference = None
+        if REFERENCE in pathfinders:
+            _, reference = bench_pathfinder(pathfinders[REFERENCE], pairs, mesh)
+        results['meshes'][name] = {
+            'boxes': len(mesh['boxes']),
+            'queries': len(pairs),
+            'pathfinders': dict((key, bench_pathfinder(pathfinder, pairs, mesh, reference)[0])
+                                for key, pathfinder in pathfinders.items()),
+        }
+    return results
+
+
+def compare(baseline, results, threshold=REGRESSION):
+    """
+    Lines up two sets of results from bench_pathfinders
+
+    Returns:
+        A list of (mesh, pathfinder, baseline p50 ms, p50 ms, ratio, regressed)
+        for every pathfinder measured in both
+    """
+    rows = []
+    for name, mesh_results in sorted(results['meshes'].items()):
+        old_mesh = baseline['meshes'].get(name, {}).get('pathfinders', {})
+        for key, new in sorted(mesh_results['pathfinders'].items()):
+            if key not in old_mesh:
+                continue
+            ratio = new['p50_ms'] / old_mesh[key]['p50_ms'] if old_mesh[key]['p50_ms'] else 1.0
+            rows.append((name, key, old_mesh[key]['p50_ms'], new['p50_ms'], ratio, ratio > threshold))
+    return rows
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print("usage: %s results.json [baseline.json] [map.mesh.pickle ...]" % sys.argv[0])
+        sys.exit(-1)
+
+    output = sys.argv[1]
+    baselines = [arg for arg in sys.argv[2:] if arg.endswith('.json')]
+    meshes = nm_benchmark.load_meshes([arg for arg in sys.argv[2:] if not arg.endswith('.json')])
+
+    results = bench_pathfinders(meshes)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    print("%-32s %-24s %8s %8s %8s %9s %8s %8s %8s %8s %8s %8s" % ('mesh', 'pathfinder', 'p50 ms', 'p95 ms',
+                                                                   'mean ms', 'expanded', 'length', 'pushes',
+                                                                   'stale', 'reexp', 'longer', 'more exp'))
+    for name, mesh_results in sorted(results['meshes'].items()):
+        for key, row in sorted(mesh_results['pathfinders'].items()):
+            print("%-32s %-24s %8.3f %8.3f %8.3f %9.1f %8.1f %8.1f %8.1f %8.1f %7.0f%% %7.0f%%"
+                  % (name, key, row['p50_ms'], row['p95_ms'], row['mean_ms'], row['expanded'],
+                     row['length'], row['pushes'], row['stale'], row['reexpansions'],
+                     100 * row.get('longer', 0), 100 * row.get('more_expanded', 0)))
+    print("longer and more exp: share of queries beyond %s on the same query" % REFERENCE)
+
+    regressed = False
+    for baseline in baselines:
+        with open(baseline) as f:
+            rows = compare(json.load(f), results)
+        print()
+        print("%-32s %-24s %10s %10s %8s" % ('mesh', 'pathfinder', 'was ms', 'now ms', 'ratio'))
+        for name, key, old, new, ratio, slower in rows:
+            print("%-32s %-24s %10.3f %10.3f %8.2f%s" % (name, key, old, new, ratio, '  SLOWER' if slower else ''))
+            regressed = regressed or slower
+
+    sys.exit(1 if regressed else 0)
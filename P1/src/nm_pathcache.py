@@ -0,0 +1,95 @@
+from collections import OrderedDict
+
+import nm_pathfinder
+
+
+class PathCache(object):
+    """ Memoizes the box corridor between pairs of boxes with LRU eviction.
+
+    A query whose endpoints fall in a (src_box, dst_box) pair seen before skips
+    the search and only places the path points along the stored corridor.
+    Pairs with no path between them are remembered too.
+    """
+
+    def __init__(self, mesh, capacity=1024):
+        """
+        Args:
+            mesh:       The mesh the queries run over.
+            capacity:   The most box pairs kept before the least recently used is dropped.
+        """
+        self.mesh = mesh
+        self.capacity = capacity
+        self.corridors = OrderedDict()  # (src_box, dst_box) -> list of boxes, or None for no path
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.corridors)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.corridors),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.corridors.clear()
+
+    def invalidate(self, boxes):
+        """
+        Drops the cached corridors that can no longer be trusted after the
+        given boxes were removed from or added to the mesh
+
+        Args:
+            boxes:  The boxes that changed.
+
+        Returns:    The number of entries dropped.
+        """
+        boxes = set(boxes)
+        stale = [key for key, corridor in self.corridors.items()
+                 if key[0] in boxes or key[1] in boxes
+                 or (corridor is None and boxes)
+                 or (corridor is not None and not boxes.isdisjoint(corridor))]
+        for key in stale:
+            del self.corridors[key]
+        return len(stale)
+
+    def find_path(self, source_point, destination_point):
+        """
+        Same contract as nm_pathfinder.astar_find_path, answered from the cache
+        when the pair of boxes is known
+
+        Returns:
+            A path (list of points) from source_point to destination_point if exists
+            A list of boxes explored, just the corridor on a hit
+        """
+        src_box = nm_pathfinder.find_box(source_point, self.mesh)
+        dst_box = nm_pathfinder.find_box(destination_point, self.mesh)
+        if (src_box is None or dst_box is None):
+            return nm_pathfinder.astar_find_path(source_point, destination_point, self.mesh)
+
+        key = (src_box, dst_box)
+        if key in self.corridors:
+            self.hits += 1
+            self.corridors.move_to_end(key)
+            corridor = self.corridors[key]
+            explored = corridor if corridor is not None else [src_box, dst_box]
+        else:
+            self.misses += 1
+            corridor, explored = nm_pathfinder.find_corridor(source_point, destination_point, self.mesh)
+            self.corridors[key] = corridor
+            if len(self.corridors) > self.capacity:
+                self.corridors.popitem(last=False)
+                self.evictions += 1
+
+        if corridor is None:
+            print("No path!")
+            return [source_point, destination_point], explored
+
+        return nm_pathfinder.corridor_path(source_point, destination_point, corridor, self.mesh), explored
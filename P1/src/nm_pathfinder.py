@@ -1,10 +1,59 @@
 from math import inf, sqrt, pow
 from heapq import heappop, heappush
+from collections import Counter
 
+# pushes, pops, stale entries skipped and boxes expanded again, summed over
+# every Frontier since the last reset_search_stats()
+search_stats = Counter()
 
 
+def reset_search_stats():
+    search_stats.clear()
 
-def find_path(source_point, destination_point, mesh):
+
+class Frontier(object):
+    """ Priority queue of boxes that drops entries made stale by a cheaper push.
+
+    Pushing an item again only records its new priority, the old heap entry is
+    skipped when it comes up instead of being expanded a second time.
+    """
+
+    def __init__(self, stats=search_stats):
+        self.heap = []
+        self.priority = {}  # item -> priority of its live heap entry
+        self.popped = set()
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.priority)
+
+    def push(self, priority, item):
+        self.priority[item] = priority
+        heappush(self.heap, (priority, item))
+        self.stats['pushes'] += 1
+
+    def drop_stale(self):
+        while self.heap and self.priority.get(self.heap[0][1]) != self.heap[0][0]:
+            heappop(self.heap)
+            self.stats['stale'] += 1
+
+    def peek(self):
+        # lowest live priority, the frontier must not be empty
+        self.drop_stale()
+        return self.heap[0][0]
+
+    def pop(self):
+        self.drop_stale()
+        priority, item = heappop(self.heap)
+        del self.priority[item]
+        self.stats['pops'] += 1
+        if item in self.popped:
+            self.stats['reexpansions'] += 1
+        self.popped.add(item)
+        return priority, item
+
+
+def find_path(source_point, destination_point, mesh, boxes=None):
     """
     Searches for a path from source_point to destination_point through the mesh
 
@@ -12,6 +61,7 @@ def find_path(source_point, destination_point, mesh):
         source_point: starting point of the pathfinder
         destination_point: the ultimate goal the pathfinder must reach
         mesh: pathway constraints the path adheres to
+        boxes: optional dict the explored boxes are recorded in as the search runs
 
     Returns:
 
@@ -20,7 +70,8 @@ def find_path(source_point, destination_point, mesh):
     """
     path = []
     # mapping of boxes to (backpointer to previous box), used to find the path
-    boxes = {}
+    if (boxes is None):
+        boxes = {}
 
     # p is the current from the src
     src_box = find_box(source_point, mesh)
@@ -28,7 +79,7 @@ def find_path(source_point, destination_point, mesh):
 
 
     p_box = src_box
-    if (src_box is None or dst_box is None):
+    if (not connected(src_box, dst_box, mesh)):
         print("No path!")
         path.append(source_point)
         path.append(destination_point)
@@ -48,15 +99,16 @@ def find_path(source_point, destination_point, mesh):
 
 
     boxes[src_box] = True
+    portals = get_portals(mesh)
     p_src = source_point
     entrypoint = None
-    frontier = []  # takes in a (priority, {stuff})
+    frontier = Frontier()  # takes in a (priority, {stuff})
 
     # stuff has:
     # current box
     # destination type (src or dst) to distinguish forward or back
-    heappush(frontier, (-1, src_box, destination_point))
-    heappush(frontier, (-1, dst_box, source_point))
+    frontier.push(-1, (src_box, destination_point))
+    frontier.push(-1, (dst_box, source_point))
 
     # detail points
     forward_points = {src_box : source_point}
@@ -72,7 +124,7 @@ def find_path(source_point, destination_point, mesh):
 
     pathFound = False
     while (frontier):
-        p_priority, p_box, curr_goal = heappop(frontier)
+        p_priority, (p_box, curr_goal) = frontier.pop()
         boxes[p_box] = True
 
         # Check if goal box has been explored by other search direction
@@ -86,8 +138,8 @@ def find_path(source_point, destination_point, mesh):
                                                 (backward_points, backward_prev, backward_cost, src_box)
         p_src = points[p_box]
 
-        for neighbor in mesh["adj"][p_box]:
-            entrypoint = find_next_point(p_src, p_box, neighbor)
+        for neighbor, portal in zip(mesh["adj"][p_box], portals[p_box]):
+            entrypoint = clamp_to_portal(p_src, portal)
             link_cost = euclidean(p_src, entrypoint)
             new_cost = cost_so_far[p_box] + link_cost
 
@@ -108,7 +160,7 @@ def find_path(source_point, destination_point, mesh):
                 #     p_priority = new_cost
 
                 p_priority = new_cost + euclidean(entrypoint, curr_goal)
-                heappush(frontier, (p_priority, neighbor, curr_goal))
+                frontier.push(p_priority, (neighbor, curr_goal))
 
     if (pathFound):
         # print("Found Path")
@@ -184,7 +236,52 @@ def construct_path(last_box, target_box, prev_dict, points_dict, last_point=None
 
 
 
+def build_box_index(mesh, cell_size=None):
+    """
+    Buckets the boxes of the mesh into a uniform grid so a point only has to be
+    checked against the few boxes overlapping its cell
+
+    Args:
+        mesh: pathway constraints the path adheres to
+        cell_size: side length of a grid cell, defaults to the average box side
+
+    Returns:
+        A dict holding the cell size and a mapping of (cx, cy) cells to the
+        positions in mesh["boxes"] of every box overlapping that cell
+    """
+    boxes = mesh["boxes"]
+    if (cell_size is None):
+        area = sum((box[1] - box[0]) * (box[3] - box[2]) for box in boxes)
+        cell_size = max(1, sqrt(area / len(boxes))) if (len(boxes) > 0) else 1
+
+    cells = {}
+    for i, box in enumerate(boxes):
+        for cx in range(int(box[0] // cell_size), int(box[1] // cell_size) + 1):
+            for cy in range(int(box[2] // cell_size), int(box[3] // cell_size) + 1):
+                cells.setdefault((cx, cy), []).append(i)
+
+    return {"cell_size": cell_size, "cells": cells}
+
+
 def find_box(p, mesh):
+    # the grid is built on the first lookup and kept on the mesh afterwards
+    index = mesh.get("index")
+    if (index is None):
+        index = mesh["index"] = build_box_index(mesh)
+
+    boxes = mesh["boxes"]
+    cell_size = index["cell_size"]
+    cell = (int(p[0] // cell_size), int(p[1] // cell_size))
+
+    # positions are stored in mesh order, so ties on shared edges resolve
+    # to the same box the linear scan would return
+    for i in index["cells"].get(cell, ()):
+        if (check_in_box(p, boxes[i])):
+            return boxes[i]
+    return None
+
+
+def find_box_linear(p, mesh):
     for box in mesh["boxes"]:
         if (check_in_box(p, box)):
             return box
@@ -227,8 +324,102 @@ def find_next_point(n, srcbox, dstbox):
     return (ret_x, ret_y)
 
 
+def find_portal(srcbox, dstbox):
+    """
+    Finds the segment shared by two adjacent boxes, the same one find_next_point
+    clamps onto, as an (x1, x2, y1, y2) range. Ranges left open are infinite.
+    """
+    x_lo, x_hi, y_lo, y_hi = -inf, inf, -inf, inf
+
+    # left and right meet
+    if (srcbox[0] == dstbox[1] or srcbox[1] == dstbox[0]):
+        x_lo = x_hi = srcbox[0] if (srcbox[0] == dstbox[1]) else srcbox[1]
+        y_lo, y_hi = max(srcbox[2], dstbox[2]), min(srcbox[3], dstbox[3])
+
+    # top and down meet
+    if (srcbox[2] == dstbox[3] or srcbox[3] == dstbox[2]):
+        y_lo = y_hi = srcbox[2] if (srcbox[2] == dstbox[3]) else srcbox[3]
+        x_lo, x_hi = max(srcbox[0], dstbox[0]), min(srcbox[1], dstbox[1])
+
+    return (x_lo, x_hi, y_lo, y_hi)
+
+
+def clamp_to_portal(n, portal):
+    # same clamping order as find_next_point so both give identical points
+    x_lo, x_hi, y_lo, y_hi = portal
+    ret_x = x_lo if (n[0] <= x_lo) else x_hi if (x_hi <= n[0]) else n[0]
+    ret_y = y_lo if (n[1] <= y_lo) else y_hi if (y_hi <= n[1]) else n[1]
+    return (ret_x, ret_y)
+
+
+def build_portals(mesh):
+    """
+    Precomputes the portal of every adjacency in the mesh
+
+    Args:
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+        A mapping of each box to the portals towards its neighbors, in the
+        same order as mesh["adj"][box]
+    """
+    return dict((box, [find_portal(box, neighbor) for neighbor in neighbors])
+                for box, neighbors in mesh["adj"].items())
+
+
+def build_components(mesh):
+    """
+    Labels the connected components of the box graph
+
+    Args:
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+        A mapping of each box to the id of its component
+    """
+    components = {}
+    label = 0
+    for start in mesh["adj"]:
+        if (start in components):
+            continue
+        label += 1
+        components[start] = label
+        stack = [start]
+        while stack:
+            box = stack.pop()
+            for neighbor in mesh["adj"][box]:
+                if (neighbor not in components):
+                    components[neighbor] = label
+                    stack.append(neighbor)
+    return components
+
+
+def get_components(mesh):
+    # built on first use and kept on the mesh like the point location grid
+    components = mesh.get("components")
+    if (components is None):
+        components = mesh["components"] = build_components(mesh)
+    return components
+
+
+def connected(src_box, dst_box, mesh):
+    # O(1) check that a search between the two boxes can succeed at all
+    if (src_box is None or dst_box is None):
+        return False
+    components = get_components(mesh)
+    return components.get(src_box) == components.get(dst_box)
+
+
+def get_portals(mesh):
+    # built on first use and kept on the mesh like the point location grid
+    portals = mesh.get("portals")
+    if (portals is None):
+        portals = mesh["portals"] = build_portals(mesh)
+    return portals
 
-def astar_find_path(source_point, destination_point, mesh):
+
+
+def astar_find_path(source_point, destination_point, mesh, boxes=None):
     """
     Searches for a path from source_point to destination_point through the mesh
 
@@ -236,6 +427,7 @@ def astar_find_path(source_point, destination_point, mesh):
         source_point: starting point of the pathfinder
         destination_point: the ultimate goal the pathfinder must reach
         mesh: pathway constraints the path adheres to
+        boxes: optional dict the explored boxes are recorded in as the search runs
 
     Returns:
 
@@ -244,16 +436,14 @@ def astar_find_path(source_point, destination_point, mesh):
     """
     path = []
     # mapping of boxes to (backpointer to previous box), used to find the path
-    boxes = {}
+    if (boxes is None):
+        boxes = {}
     # p is the current from the src
     # q will be the current from the
     src_box = find_box(source_point, mesh)
     dst_box = find_box(destination_point, mesh)
 
-    p_box = src_box
-    q_box = dst_box
-
-    if (src_box is None or dst_box is None):
+    if (not connected(src_box, dst_box, mesh)):
         print("No path!")
         path.append(source_point)
         path.append(destination_point)
@@ -264,14 +454,50 @@ def astar_find_path(source_point, destination_point, mesh):
         return path, boxes.keys()
 
     boxes[src_box] = True
+    pathFound, forward_prev, forward_points = astar_search(source_point, destination_point,
+                                                           src_box, dst_box, mesh, boxes)
+
+    if (pathFound):
+        # assert(forward_points[src_box] == source_point)
+        path = construct_path(dst_box, src_box, forward_prev, forward_points, destination_point)
+
+    else:
+        path.append(source_point)
+        path.append(destination_point)
+        boxes[src_box] = True
+        boxes[dst_box] = True
+        print("No path!")
+
+    return path, boxes.keys()
+
+
+def astar_search(source_point, destination_point, src_box, dst_box, mesh, boxes, allowed=None):
+    """
+    Runs A* over the box graph from src_box until dst_box is popped
+
+    Args:
+        source_point: starting point of the pathfinder
+        destination_point: the ultimate goal the pathfinder must reach
+        src_box: the box holding source_point
+        dst_box: the box holding destination_point
+        mesh: pathway constraints the path adheres to
+        boxes: dict the explored boxes are recorded in
+        allowed: optional set of the only boxes the search may enter
+
+    Returns:
+        Whether dst_box was reached, the backpointers and the entry point of
+        every box reached
+    """
+    portals = get_portals(mesh)
+    p_box = src_box
     p_src = source_point
     entrypoint = None
-    frontier = []  # takes in a (priority, {stuff})
+    frontier = Frontier()  # takes in a (priority, {stuff})
 
     # stuff has:
     # current box
 
-    heappush(frontier, (0, p_box))
+    frontier.push(0, p_box)
     forward_points = {src_box : source_point}
 
     # used to track edge costs
@@ -279,14 +505,11 @@ def astar_find_path(source_point, destination_point, mesh):
 
     # track backpointers
     forward_prev = {}
-    backward_prev = {}
-
     forward_prev[p_box] = None
-    backward_prev[q_box] = None
 
     pathFound = False
     while (frontier):
-        p_priority, p_box = heappop(frontier)
+        p_priority, p_box = frontier.pop()
         boxes[p_box] = True
 
         if (p_box == dst_box):
@@ -294,9 +517,11 @@ def astar_find_path(source_point, destination_point, mesh):
             break
 
         p_src = forward_points[p_box]
-        for neighbor in mesh["adj"][p_box]:
+        for neighbor, portal in zip(mesh["adj"][p_box], portals[p_box]):
+            if (allowed is not None and neighbor not in allowed):
+                continue
 
-            entrypoint = find_next_point(p_src, p_box, neighbor)
+            entrypoint = clamp_to_portal(p_src, portal)
             link_cost = euclidean(p_src, entrypoint)
             new_cost = forward_cost[p_box] + link_cost
 
@@ -315,18 +540,285 @@ def astar_find_path(source_point, destination_point, mesh):
 
                 p_priority = new_cost + euclidean(entrypoint, destination_point)
 
-                heappush(frontier, (p_priority, neighbor))
+                frontier.push(p_priority, neighbor)
 
+    return pathFound, forward_prev, forward_points
 
-    if (pathFound):
-        # assert(forward_points[src_box] == source_point)
-        path = construct_path(p_box, src_box, forward_prev, forward_points, destination_point)
 
-    else:
-        path.append(source_point)
-        path.append(destination_point)
+def bidirectional_find_path(source_point, destination_point, mesh, boxes=None):
+    """
+    Searches for a path with A* from both ends at once, keeping a separate
+    frontier per direction. Every box reached by both directions is a meeting
+    point, and the search stops once the best meeting cost is no larger than
+    the lowest priority left in a frontier. The smaller frontier is expanded next.
+
+    The point a box is entered at depends on the direction that reached it,
+    so the cost of a box is not fixed and the meeting-cost stop rule is not
+    sound: both frontiers keep expanding, and the search expands more boxes
+    and takes longer than astar_find_path on most queries, with paths longer
+    on some. It is kept out of nm_batch and nm_pathbench until that changes;
+    nm_pathbench.bench_pathfinders can still be handed it explicitly.
+
+    Args:
+        source_point: starting point of the pathfinder
+        destination_point: the ultimate goal the pathfinder must reach
+        mesh: pathway constraints the path adheres to
+        boxes: optional dict the explored boxes are recorded in as the search runs
+
+    Returns:
+
+        A path (list of points) from source_point to destination_point if exists
+        A list of boxes explored by the algorithm
+    """
+    if (boxes is None):
+        boxes = {}
+    src_box = find_box(source_point, mesh)
+    dst_box = find_box(destination_point, mesh)
+
+    if (not connected(src_box, dst_box, mesh)):
+        print("No path!")
+        if (src_box is not None):
+            boxes[src_box] = True
+        if (dst_box is not None):
+            boxes[dst_box] = True
+        return [source_point, destination_point], boxes.keys()
+
+    portals = get_portals(mesh)
+
+    # per direction: frontier, entry points, cost so far, backpointers, goal point
+    forward = (Frontier(), {src_box: source_point}, {src_box: 0}, {src_box: None}, destination_point)
+    backward = (Frontier(), {dst_box: destination_point}, {dst_box: 0}, {dst_box: None}, source_point)
+    forward[0].push(0, src_box)
+    backward[0].push(0, dst_box)
+
+    best_cost = inf
+    meeting_box = None
+    if (src_box == dst_box):
+        best_cost = euclidean(source_point, destination_point)
+        meeting_box = src_box
+
+    while (forward[0] and backward[0]):
+        if (best_cost <= max(forward[0].peek(), backward[0].peek())):
+            break
+
+        this, other = (forward, backward) if (len(forward[0]) <= len(backward[0])) else (backward, forward)
+        frontier, points, cost_so_far, prev, curr_goal = this
+        p_priority, p_box = frontier.pop()
+        boxes[p_box] = True
+
+        p_src = points[p_box]
+        for neighbor, portal in zip(mesh["adj"][p_box], portals[p_box]):
+            entrypoint = clamp_to_portal(p_src, portal)
+            new_cost = cost_so_far[p_box] + euclidean(p_src, entrypoint)
+
+            if (neighbor not in prev or new_cost < cost_so_far[neighbor]):
+                cost_so_far[neighbor] = new_cost
+                prev[neighbor] = p_box
+                points[neighbor] = entrypoint
+                frontier.push(new_cost + euclidean(entrypoint, curr_goal), neighbor)
+
+                # the other direction has been here too, join the two halves
+                if (neighbor in other[2]):
+                    meeting_cost = new_cost + euclidean(entrypoint, other[1][neighbor]) + other[2][neighbor]
+                    if (meeting_cost < best_cost):
+                        best_cost = meeting_cost
+                        meeting_box = neighbor
+
+    if (meeting_box is None):
+        print("No path!")
         boxes[src_box] = True
         boxes[dst_box] = True
-        print("No path!")
+        return [source_point, destination_point], boxes.keys()
 
-    return path, boxes.keys()
+    boxes[meeting_box] = True
+    f_path = construct_path(meeting_box, src_box, forward[3], forward[1])
+    b_path = construct_path(meeting_box, dst_box, backward[3], backward[1], None, False)
+
+    # handle any cases where we have duplicate when stitching paths together
+    if (len(f_path) > 1 and f_path[-1] == b_path[0]):
+        f_path = f_path[:-1]
+
+    return f_path + b_path, boxes.keys()
+
+
+def find_corridor(source_point, destination_point, mesh):
+    """
+    Searches for the sequence of boxes an A* path passes through
+
+    Args:
+        source_point: starting point of the pathfinder
+        destination_point: the ultimate goal the pathfinder must reach
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+        The list of boxes from the source box to the destination box, or None
+        if there is no path
+        A list of boxes explored by the algorithm
+    """
+    boxes = {}
+    src_box = find_box(source_point, mesh)
+    dst_box = find_box(destination_point, mesh)
+    if (not connected(src_box, dst_box, mesh)):
+        return None, boxes.keys()
+
+    boxes[src_box] = True
+    pathFound, prev, points = astar_search(source_point, destination_point, src_box, dst_box, mesh, boxes)
+    if (not pathFound):
+        return None, boxes.keys()
+
+    corridor = [dst_box]
+    while corridor[-1] != src_box:
+        corridor.append(prev[corridor[-1]])
+    corridor.reverse()
+    return corridor, boxes.keys()
+
+
+def corridor_path(source_point, destination_point, corridor, mesh):
+    """
+    Places the points of a path through an already known corridor of boxes by
+    clamping onto each portal in turn, the same points A* picks along it
+
+    Args:
+        source_point: a point in corridor[0]
+        destination_point: a point in corridor[-1]
+        corridor: list of adjacent boxes from the source box to the destination box
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+        A path (list of points) from source_point to destination_point
+    """
+    portals = get_portals(mesh)
+    path = [source_point]
+    p_src = source_point
+    for p_box, neighbor in zip(corridor, corridor[1:]):
+        portal = portals[p_box][mesh["adj"][p_box].index(neighbor)]
+        p_src = clamp_to_portal(p_src, portal)
+        if (path[-1] != p_src):
+            path.append(p_src)
+    if (path[-1] != destination_point):
+        path.append(destination_point)
+    return path
+
+
+def triarea2(a, b, c):
+    # twice the signed area of the triangle a, b, c
+    return (c[0] - a[0]) * (b[1] - a[1]) - (b[0] - a[0]) * (c[1] - a[1])
+
+
+def portal_ends(srcbox, dstbox, portal):
+    """
+    Gives the two ends of the portal from srcbox into dstbox as a (left, right)
+    pair, as seen when crossing the portal from srcbox into dstbox
+    """
+    x_lo = max(portal[0], srcbox[0], dstbox[0])
+    x_hi = min(portal[1], srcbox[1], dstbox[1])
+    y_lo = max(portal[2], srcbox[2], dstbox[2])
+    y_hi = min(portal[3], srcbox[3], dstbox[3])
+    p1, p2 = (x_lo, y_lo), (x_hi, y_hi)
+
+    # cross straight over the shared edge, or from center to center when the
+    # boxes overlap instead of touching
+    mid = ((x_lo + x_hi) / 2, (y_lo + y_hi) / 2)
+    if (x_lo == x_hi):
+        origin = (mid[0] - 1, mid[1]) if (srcbox[1] == x_lo) else (mid[0] + 1, mid[1])
+    elif (y_lo == y_hi):
+        origin = (mid[0], mid[1] - 1) if (srcbox[3] == y_lo) else (mid[0], mid[1] + 1)
+    else:
+        origin = ((srcbox[0] + srcbox[1]) / 2, (srcbox[2] + srcbox[3]) / 2)
+        mid = ((dstbox[0] + dstbox[1]) / 2, (dstbox[2] + dstbox[3]) / 2)
+
+    if (triarea2(origin, mid, p1) < 0):
+        return p1, p2
+    return p2, p1
+
+
+def funnel_path(source_point, destination_point, corridor, mesh):
+    """
+    Pulls the path through a corridor of boxes taut with the funnel algorithm,
+    giving the shortest path that stays inside the corridor. Waypoints are only
+    kept where the path bends around a portal end.
+
+    Args:
+        source_point: a point in corridor[0]
+        destination_point: a point in corridor[-1]
+        corridor: list of adjacent boxes from the source box to the destination box
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+        A path (list of points) from source_point to destination_point
+    """
+    # start from the last box holding the source and stop at the first one
+    # holding the destination; an endpoint on a portal is in the boxes on both
+    # sides, and the collinear portal ends would open the funnel out to the
+    # far end of the portal and back
+    first = max(k for k, box in enumerate(corridor) if check_in_box(source_point, box))
+    last = min(k for k, box in enumerate(corridor) if k >= first and check_in_box(destination_point, box))
+    corridor = corridor[first:last + 1]
+
+    portals = get_portals(mesh)
+    ends = [(source_point, source_point)]
+    for p_box, neighbor in zip(corridor, corridor[1:]):
+        portal = portals[p_box][mesh["adj"][p_box].index(neighbor)]
+        ends.append(portal_ends(p_box, neighbor, portal))
+    ends.append((destination_point, destination_point))
+
+    path = [source_point]
+    apex = left = right = source_point
+    apex_index = left_index = right_index = 0
+
+    i = 1
+    while i < len(ends):
+        new_left, new_right = ends[i]
+
+        # tighten the right side of the funnel
+        if (triarea2(apex, right, new_right) <= 0):
+            if (apex == right or triarea2(apex, left, new_right) > 0):
+                right, right_index = new_right, i
+            else:
+                # right crossed over left, the left end becomes a waypoint
+                path.append(left)
+                apex, apex_index = left, left_index
+                left = right = apex
+                left_index = right_index = apex_index
+                i = apex_index + 1
+                continue
+
+        # tighten the left side of the funnel
+        if (triarea2(apex, left, new_left) >= 0):
+            if (apex == left or triarea2(apex, right, new_left) < 0):
+                left, left_index = new_left, i
+            else:
+                # left crossed over right, the right end becomes a waypoint
+                path.append(right)
+                apex, apex_index = right, right_index
+                left = right = apex
+                left_index = right_index = apex_index
+                i = apex_index + 1
+                continue
+
+        i += 1
+
+    if (path[-1] != destination_point):
+        path.append(destination_point)
+    return path
+
+
+def smooth_find_path(source_point, destination_point, mesh):
+    """
+    Searches for a corridor with A* and pulls the path through it taut
+
+    Args:
+        source_point: starting point of the pathfinder
+        destination_point: the ultimate goal the pathfinder must reach
+        mesh: pathway constraints the path adheres to
+
+    Returns:
+
+        A path (list of points) from source_point to destination_point if exists
+        A list of boxes explored by the algorithm
+    """
+    corridor, boxes = find_corridor(source_point, destination_point, mesh)
+    if (corridor is None):
+        print("No path!")
+        return [source_point, destination_point], boxes
+    return funnel_path(source_point, destination_point, corridor, mesh), boxes
@@ -0,0 +1,88 @@
+import threading
+import traceback
+
+import nm_pathfinder
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class ExploredBoxes(dict):
+    """ The boxes dict handed to a pathfinder running in the background.
+
+    Keeps the boxes in the order they were explored so another thread can read
+    the new ones without iterating a dict that is still growing, and stops the
+    search by raising SearchCancelled once the query is cancelled.
+    """
+
+    def __init__(self, cancelled):
+        dict.__init__(self)
+        self.cancelled = cancelled
+        self.order = []
+
+    def __setitem__(self, box, value):
+        if self.cancelled.is_set():
+            raise SearchCancelled()
+        if box not in self:
+            self.order.append(box)
+        dict.__setitem__(self, box, value)
+
+
+class PathQuery(object):
+    """ One path request, filled in by the worker thread as it runs. """
+
+    def __init__(self, source_point, destination_point):
+        self.source_point = source_point
+        self.destination_point = destination_point
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.explored = ExploredBoxes(self.cancelled)
+        self.path = None
+        self.error = None
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class PathService(object):
+    """ Runs path queries on a worker thread, one at a time.
+
+    Submitting a query cancels the one in flight, which gives up the next time
+    it explores a box. The caller polls the query it got back for explored
+    boxes and, once done is set, the path.
+    """
+
+    def __init__(self, mesh, pathfinder=nm_pathfinder.find_path):
+        """
+        Args:
+            mesh:       The mesh the queries run over.
+            pathfinder: A function with the find_path signature that accepts boxes.
+        """
+        self.mesh = mesh
+        self.pathfinder = pathfinder
+        self.current = None
+
+    def submit(self, source_point, destination_point):
+        self.cancel()
+        query = self.current = PathQuery(source_point, destination_point)
+        thread = threading.Thread(target=self.run, args=(query,))
+        thread.daemon = True
+        thread.start()
+        return query
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+
+    def run(self, query):
+        try:
+            query.path, _ = self.pathfinder(query.source_point, query.destination_point, self.mesh,
+                                            boxes=query.explored)
+        except SearchCancelled:
+            pass
+        except Exception as e:
+            query.error = e
+            traceback.print_exc()
+        query.done.set()
@@ -0,0 +1,113 @@
+import nm_pathfinder
+
+# hops through the finer mesh the refinement may stray from the coarse corridor
+RING = 2
+
+
+def box_center(box):
+    return ((box[0] + box[1]) // 2, (box[2] + box[3]) // 2)
+
+
+def endpoint_boxes(source_point, destination_point, pyramid):
+    """
+    Follows the boxes holding both points up the pyramid through their parents,
+    as long as the two stay connected
+
+    Returns:
+        The (src_box, dst_box) of every level from the finest up, empty if the
+        points are not connected on the finest level
+    """
+    fine = pyramid['levels'][0]
+    src_box = nm_pathfinder.find_box(source_point, fine)
+    dst_box = nm_pathfinder.find_box(destination_point, fine)
+    if (not nm_pathfinder.connected(src_box, dst_box, fine)):
+        return []
+
+    ends = [(src_box, dst_box)]
+    for k, parents in enumerate(pyramid['parents']):
+        src_box, dst_box = parents[src_box], parents[dst_box]
+        if (not nm_pathfinder.connected(src_box, dst_box, pyramid['levels'][k + 1])):
+            break
+        ends.append((src_box, dst_box))
+    return ends
+
+
+def refinement_boxes(corridor, children, mesh, keep, ring=None):
+    """
+    The boxes of the finer level a search may use to refine a coarse corridor:
+    those under the corridor, the ones in keep, and every box up to ring hops
+    away from them
+    """
+    if (ring is None):
+        ring = RING
+    allowed = set(keep)
+    for box in corridor:
+        allowed.update(children[box])
+    border = list(allowed)
+    for _ in range(ring):
+        grown = []
+        for box in border:
+            for neighbor in mesh["adj"][box]:
+                if neighbor not in allowed:
+                    allowed.add(neighbor)
+                    grown.append(neighbor)
+        border = grown
+    return allowed
+
+
+def search_corridor(source_point, destination_point, src_box, dst_box, mesh, boxes, allowed=None):
+    found, prev, points = nm_pathfinder.astar_search(source_point, destination_point, src_box, dst_box,
+                                                     mesh, boxes, allowed)
+    if (not found):
+        return None
+    corridor = [dst_box]
+    while corridor[-1] != src_box:
+        corridor.append(prev[corridor[-1]])
+    corridor.reverse()
+    return corridor
+
+
+def pyramid_find_path(source_point, destination_point, pyramid):
+    """
+    Searches the coarsest level of a pyramid from nm_meshbuilder.build_pyramid
+    on which the boxes of both points are still connected, then refines the
+    corridor one level at a time, each search only entering boxes near the
+    corridor found above it. A level where that fails is searched in full.
+    Above the finest level the searches run between box centers.
+
+    Args:
+        source_point: starting point of the pathfinder
+        destination_point: the ultimate goal the pathfinder must reach
+        pyramid: meshes of one map at several feature sizes, finest first
+
+    Returns:
+
+        A path (list of points) from source_point to destination_point if exists
+        A list of the boxes explored on every level searched, coarsest first
+    """
+    fine = pyramid['levels'][0]
+    ends = endpoint_boxes(source_point, destination_point, pyramid)
+    if (len(ends) < 2):
+        return nm_pathfinder.astar_find_path(source_point, destination_point, fine)
+
+    corridor = None
+    explored = []
+    for k in reversed(range(len(ends))):
+        mesh = pyramid['levels'][k]
+        src_box, dst_box = ends[k]
+        src, dst = (source_point, destination_point) if (k == 0) else (box_center(src_box), box_center(dst_box))
+
+        boxes = {src_box: True}
+        allowed = None
+        if (corridor is not None):
+            allowed = refinement_boxes(corridor, pyramid['children'][k], mesh, ends[k])
+        corridor = search_corridor(src, dst, src_box, dst_box, mesh, boxes, allowed)
+        if (corridor is None and allowed is not None):
+            corridor = search_corridor(src, dst, src_box, dst_box, mesh, boxes)
+        # the levels can share box tuples, so every level's boxes are kept
+        explored.extend(boxes.keys())
+        if (corridor is None):
+            print("No path!")
+            return [source_point, destination_point], explored
+
+    return nm_pathfinder.corridor_path(source_point, destination_point, corridor, fine), explored
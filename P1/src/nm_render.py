@@ -0,0 +1,43 @@
+import numpy
+from matplotlib.pyplot import imread
+
+PINK = (255, 192, 203)
+
+
+def load_rgb(filename, subsample=1):
+    """
+    Loads a map as an RGB uint8 array, keeping every subsample-th pixel the way
+    tkinter.PhotoImage.subsample does
+    """
+    img = imread(filename)
+    if img.dtype != numpy.uint8:
+        img = (img * 255).astype(numpy.uint8)
+    if len(img.shape) == 2:
+        img = numpy.stack([img] * 3, axis=2)
+    return numpy.ascontiguousarray(img[::subsample, ::subsample, :3])
+
+
+def outline_boxes(raster, boxes, subsample, color=PINK):
+    """
+    Draws the outline of every box into raster, in place
+
+    Args:
+        raster: RGB array of the subsampled map
+        boxes: (x1, x2, y1, y2) boxes in map coordinates
+        subsample: how many map pixels one raster pixel stands for
+        color: RGB outline color
+    """
+    rows, cols = raster.shape[0] - 1, raster.shape[1] - 1
+    for box in boxes:
+        x1, x2 = min(int(box[0] // subsample), rows), min(int(box[1] // subsample), rows)
+        y1, y2 = min(int(box[2] // subsample), cols), min(int(box[3] // subsample), cols)
+        raster[x1, y1:y2 + 1] = color
+        raster[x2, y1:y2 + 1] = color
+        raster[x1:x2 + 1, y1] = color
+        raster[x1:x2 + 1, y2] = color
+
+
+def ppm_data(raster):
+    # binary PPM, which tkinter.PhotoImage(data=...) reads without a file
+    header = ('P6 %d %d 255\n' % (raster.shape[1], raster.shape[0])).encode('ascii')
+    return header + raster.tobytes()
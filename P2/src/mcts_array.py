@@ -0,0 +1,150 @@
+import numpy
+from random import randrange
+from timeit import default_timer as time
+
+# an action (R, C, r, c) is stored as the byte 27 * R + 9 * C + 3 * r + c
+ACTIONS = tuple((k // 27, k // 9 % 3, k // 3 % 3, k % 3) for k in range(81))
+
+# node fields and their array types
+FIELDS = (
+    ('parent', numpy.int32),        # index of the parent node, -1 for the root
+    ('visits', numpy.int32),        # simulations through the node
+    ('wins', numpy.float64),        # total result of those simulations
+    ('first_child', numpy.int32),   # index of the first child, -1 before the node is expanded
+    ('child_count', numpy.uint8),   # number of children, one per legal action
+    ('untried', numpy.uint8),       # children not simulated yet, the last ones of the block
+    ('action', numpy.uint8),        # the action leading to the node
+)
+
+
+def action_code(action):
+    R, C, r, c = action
+    return 27 * R + 9 * C + 3 * r + c
+
+
+class ArrayTree(object):
+    """ An MCTS tree kept in one array per node field instead of node objects.
+
+    The first time a node is expanded it gets a contiguous block with a child
+    for every legal action, so its children are a slice of each array and UCB
+    is computed for all of them at once. The untried children are kept at the
+    end of the block; trying one swaps it with the first untried child.
+    """
+
+    def __init__(self, capacity=1024):
+        for name, dtype in FIELDS:
+            setattr(self, name, numpy.zeros(capacity, dtype))
+        self.capacity = capacity
+        self.size = 1
+        self.parent[0] = -1
+        self.first_child[0] = -1
+
+    def __len__(self):
+        return self.size
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name, _ in FIELDS)
+
+    def grow(self, needed):
+        capacity = max(2 * self.capacity, needed)
+        for name, dtype in FIELDS:
+            array = numpy.zeros(capacity, dtype)
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def add_children(self, node, actions):
+        start, end = self.size, self.size + len(actions)
+        if end > self.capacity:
+            self.grow(end)
+        self.parent[start:end] = node
+        self.first_child[start:end] = -1
+        self.action[start:end] = [action_code(action) for action in actions]
+        self.first_child[node] = start
+        self.child_count[node] = self.untried[node] = len(actions)
+        self.size = end
+
+    def try_child(self, node):
+        # moves a random untried child to the front of the untried ones and takes it
+        untried = int(self.untried[node])
+        first = self.first_child[node] + self.child_count[node] - untried
+        pick = first + randrange(untried)
+        self.action[first], self.action[pick] = self.action[pick], self.action[first]
+        self.untried[node] = untried - 1
+        return first
+
+    def best_child(self, node, explore_factor, mine):
+        first = self.first_child[node]
+        end = first + self.child_count[node]
+        visits = self.visits[first:end]
+        win_rate = self.wins[first:end] / visits
+        if not mine:
+            win_rate = 1 - win_rate
+        ucb = win_rate + explore_factor * numpy.sqrt(numpy.log(self.visits[node]) / visits)
+        return first + int(ucb.argmax())
+
+    def best_action(self):
+        # the root action with the highest win rate, None if nothing was simulated
+        first = self.first_child[0]
+        tried = self.child_count[0] - self.untried[0]
+        if first < 0 or tried == 0:
+            return None
+        win_rate = self.wins[first:first + tried] / self.visits[first:first + tried]
+        return ACTIONS[self.action[first + int(win_rate.argmax())]]
+
+
+def search(board, state, rollout, iterations=None, budget=None, explore_factor=2.0):
+    """ Grows an ArrayTree from state.
+
+    Args:
+        board:          The game setup.
+        state:          The state of the game.
+        rollout:        A function of (board, state, identity) returning the result of a simulation.
+        iterations:     The number of selection, expansion, rollout and backpropagation rounds, None for no limit.
+        budget:         Seconds after which the search stops at the end of the current round, None for no limit.
+        explore_factor: The exploration constant of UCB.
+
+    Returns:            The tree and its move_stats.
+    """
+    identity = board.current_player(state)
+    tree = ArrayTree()
+
+    start = time()
+    deadline = None if budget is None else start + budget
+    step = 0
+    nodes = 1
+    max_depth = 0
+
+    while iterations is None or step < iterations:
+        step += 1
+        node = 0
+        sampled_game = state
+        path = [0]
+
+        while not board.is_ended(sampled_game):
+            if tree.first_child[node] < 0:
+                tree.add_children(node, board.legal_actions(sampled_game))
+            expanding = tree.untried[node] > 0
+            if expanding:
+                child = tree.try_child(node)
+            else:
+                child = tree.best_child(node, explore_factor, board.current_player(sampled_game) == identity)
+            node = child
+            path.append(node)
+            sampled_game = board.next_state(sampled_game, ACTIONS[tree.action[node]])
+            if expanding:
+                nodes += 1
+                break
+
+        result = rollout(board, sampled_game, identity)
+        # the nodes of a path are distinct, so the fancy-indexed updates do not collide
+        tree.visits[path] += 1
+        tree.wins[path] += result
+        max_depth = max(max_depth, len(path) - 1)
+
+        if deadline is not None and time() >= deadline:
+            break
+
+    stats = {'iterations': step, 'nodes': nodes, 'depth': max_depth, 'seconds': time() - start,
+             'slots': len(tree), 'bytes': tree.nbytes()}
+    return tree, stats
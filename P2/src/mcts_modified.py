@@ -1,13 +1,45 @@
 import random
 from mcts_node import MCTSNode
+from mcts_table import TranspositionTable
+import mcts_parallel
+import mcts_array
 from random import choice
 from math import sqrt, log
+from collections import deque
+from timeit import default_timer as time
 
 from rollout_bot import think
 
 num_nodes = 1000
 explore_factor = 2.0
 
+# most positions kept in the transposition table of one think(), 0 to build a plain tree
+transposition_size = 0
+
+# transposition table statistics of the last think()
+table_stats = None
+
+# worker processes searching independent trees, each for num_nodes iterations
+workers = 1
+
+# milliseconds a move may take, searching as many iterations as fit instead
+# of num_nodes; None to always run num_nodes iterations
+time_budget = None
+
+# iterations, tree size, deepest level and seconds of the last think()
+move_stats = None
+
+# keep the subtree of the position reached after our move and the opponent's
+# reply for the next think(), pruned breadth first to at most reuse_size nodes
+reuse_tree = False
+reuse_size = 50000
+
+# the state after the last chosen action and the node the action led to
+previous_move = None
+
+# search in an mcts_array.ArrayTree instead of MCTSNode objects
+array_tree = False
+
 ROLLOUTS = 10
 MAX_DEPTH = 5
 HEURISTIC_WEIGHT = 2.0
@@ -40,41 +72,59 @@ def find_best_child(node, board, state, identity):
     return best_child
 
 
-def traverse_nodes(node, board, state, identity):
+def traverse_nodes(node, board, state, identity, table=None):
     """Traverses the tree until the end criterion are met.
 
+    Descends by UCB through fully expanded nodes, applying each action to the
+    state, and stops at the first node with untried actions, which gets a new
+    child, or at the end of the game.
+
     Args:
         node: A tree node from which the search is traversing.
         board: The game setup.
         state: The state of the game.
         identity: The bot's identity, either 'red' or 'blue'.
+        table: Optional TranspositionTable new children are looked up in.
 
-    Returns: A node from which the previous stage of the search can proceed.
+    Returns: The leaf from which the rollout proceeds, its state and its depth below node.
     """
-    # remove recursion
-
-    if node.is_terminal(board, state):
-        # print("Is terminal ")
-        return node
+    depth = 0
+    while not node.is_terminal(board, state):
+        expanding = node.is_expanded()
+        if expanding:
+            # print("Node is expanded ")
+            child = expand_leaf(node, board, state, table)
+        else:
+            # print("looking for best child")
+            child = find_best_child(node, board, state, identity)
 
-    if node.is_expanded():
-        # print("Node is expanded ")
-        child_node = expand_leaf(node, board, state)
-        return child_node
-    # print("looking for best child")
+        # a node shared through the table hangs under the parent and
+        # action it was last reached from; without a table the tree has
+        # one parent per node and is left as it is
+        if table is not None:
+            action = child.parent_action
+            if node.child_nodes.get(action) is not child:
+                action = next(a for a, c in node.child_nodes.items() if c is child)
+            child.parent, child.parent_action = node, action
 
-    best_child = find_best_child(node, board, state, identity)
+        node = child
+        state = board.next_state(state, child.parent_action)
+        depth += 1
+        if expanding:
+            break
 
-    return best_child
+    return node, state, depth
 
 
-def expand_leaf(node, board, state):
+def expand_leaf(node, board, state, table=None):
     """Adds a new leaf to the tree by creating a new child node for the given node.
 
     Args:
         node: The node for which a child will be added.
         board: The game setup.
         state: The state of the game.
+        table: Optional TranspositionTable; a position already in it is linked
+               as the child instead of getting a node of its own.
 
     Returns: The added child node.
     """
@@ -84,8 +134,12 @@ def expand_leaf(node, board, state):
     untried_actions.remove(action)
 
     next_state = board.next_state(state, action)
-    child_node = MCTSNode(parent=node, parent_action=action,
-                          action_list=board.legal_actions(next_state))
+    child_node = table.get(next_state) if table is not None else None
+    if child_node is None:
+        child_node = MCTSNode(parent=node, parent_action=action,
+                              action_list=board.legal_actions(next_state))
+        if table is not None:
+            table.put(next_state, child_node)
     node.child_nodes[action] = child_node
     # print(f"Current node has {len(node.child_nodes.values())}")
     return child_node
@@ -177,35 +231,142 @@ def backpropagate(node, won):
         won (win = 1, loss = -1):    An indicator of whether the bot won or lost the game.
 
     """
-    if node is None:
-        return
+    while node is not None:
+        node.wins += won
+        node.visits += 1
+        node = node.parent
 
-    node.wins += won
-    node.visits += 1
 
-    prev = node.parent
-    backpropagate(prev, won)
+def prune_tree(root_node, board, state, limit):
+    """ Keeps the first limit nodes of a tree in breadth first order.
 
+    The nodes at the edge of what is kept lose their children and get their
+    legal actions back as untried actions, so the search expands them again.
+
+    Args:
+        root_node:  The root of the tree.
+        board:      The game setup.
+        state:      The state of the game at root_node.
+        limit:      The most nodes kept.
+
+    Returns:        The number of nodes kept.
+    """
+    seen = {id(root_node)}
+    queue = deque([(root_node, state)])
+    while queue:
+        node, node_state = queue.popleft()
+        if len(seen) + len(node.child_nodes) > limit:
+            node.child_nodes = {}
+            node.untried_actions = board.legal_actions(node_state)
+            continue
+        for action, child in node.child_nodes.items():
+            if id(child) not in seen:
+                seen.add(id(child))
+                # drop links back into the rest of the old tree
+                child.parent, child.parent_action = node, action
+                queue.append((child, board.next_state(node_state, action)))
+    return len(seen)
+
+
+def reuse_subtree(board, state):
+    """ Finds the node of state among the replies to the last chosen action.
+
+    Args:
+        board:  The game setup.
+        state:  The state of the game.
+
+    Returns:    The node detached from its parent and pruned to reuse_size nodes,
+                with the number of nodes kept, or (None, 0) if the position was not searched.
+    """
+    if previous_move is None:
+        return None, 0
+    after, node = previous_move
+    for action, child in node.child_nodes.items():
+        if board.next_state(after, action) == state:
+            child.parent, child.parent_action = None, None
+            return child, prune_tree(child, board, state, reuse_size)
+    return None, 0
+
+
+def search(board, state, iterations=None, budget=None, root_node=None, nodes=1):
+    """ Grows a search tree from state.
+
+    Args:
+        board:      The game setup.
+        state:      The state of the game.
+        iterations: The number of selection, expansion, rollout and backpropagation rounds, None for no limit.
+        budget:     Seconds after which the search stops at the end of the current round, None for no limit.
+        root_node:  A tree already searched from state to continue, None to start a new one.
+        nodes:      The number of nodes in root_node's tree.
+
+    Returns:        The root node of the tree.
+    """
+    global table_stats, move_stats
 
-def think(board, state):
     identity_of_bot = board.current_player(state)
-    root_node = MCTSNode(parent=None, parent_action=None,
-                         action_list=board.legal_actions(state))
+    if root_node is None:
+        root_node, nodes = MCTSNode(parent=None, parent_action=None,
+                                    action_list=board.legal_actions(state)), 1
+    reused_nodes, reused_visits = nodes - 1, root_node.visits
+    table = TranspositionTable(transposition_size) if transposition_size else None
 
-    # need to initialize state with initlal root
-    for step in range(num_nodes):
-        sampled_game = state
-        node = root_node
+    start = time()
+    deadline = None if budget is None else start + budget
+    step = 0
+    max_depth = 0
 
-        leaf = traverse_nodes(node, board, sampled_game, identity_of_bot)
-        sampled_game = board.next_state(sampled_game, leaf.parent_action)
+    # need to initialize state with initlal root
+    while iterations is None or step < iterations:
+        step += 1
+        leaf, sampled_game, depth = traverse_nodes(root_node, board, state, identity_of_bot, table)
+        if leaf.visits == 0:
+            nodes += 1
         result_of_game = rollout(board, sampled_game, identity_of_bot)
         # print(f"Result of the game:  {result_of_game}")
         backpropagate(leaf, result_of_game)
         # print(f"Root node has {node.wins} win")
+        max_depth = max(max_depth, depth)
+
+        # checked between rounds, so the tree is always in a usable state
+        if deadline is not None and time() >= deadline:
+            break
 
+    if table is not None:
+        table_stats = table.stats()
+    move_stats = {'iterations': step, 'nodes': nodes, 'depth': max_depth, 'seconds': time() - start,
+                  'reused_nodes': reused_nodes, 'reused_visits': reused_visits}
+
+    return root_node
+
+
+def think(board, state):
+    global move_stats, previous_move
+
+    iterations, budget = num_nodes, None
+    if time_budget is not None:
+        iterations, budget = None, time_budget / 1000.0
+
+    if workers > 1:
+        previous_move = None
+        start = time()
+        totals, move_stats = mcts_parallel.root_parallel(__name__, board, state, iterations, workers, budget)
+        move_stats['seconds'] = time() - start
+        if not totals:
+            return None
+        return max(totals, key=lambda action: totals[action][0] / totals[action][1])
+
+    if array_tree:
+        previous_move = None
+        tree, move_stats = mcts_array.search(board, state, rollout, iterations, budget, explore_factor)
+        return tree.best_action()
+
+    root_node, nodes = reuse_subtree(board, state) if reuse_tree else (None, 1)
+    previous_move = None
+    root_node = search(board, state, iterations, budget, root_node, nodes)
     best_child_node = find_best_win_rate(root_node)
     if best_child_node is not None:
+        if reuse_tree:
+            previous_move = (board.next_state(state, best_child_node.parent_action), best_child_node)
         print(root_node.tree_to_string())
         return best_child_node.parent_action
 
@@ -1,6 +1,8 @@
 
 
 class MCTSNode:
+    __slots__ = ('parent', 'parent_action', 'child_nodes', 'untried_actions', 'wins', 'visits')
+
     def __init__(self, parent=None, parent_action=None, action_list=[]):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
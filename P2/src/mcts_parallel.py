@@ -0,0 +1,67 @@
+import random
+import importlib
+import multiprocessing
+
+# one pool kept between moves, rebuilt when the worker count changes
+pool = None
+pool_workers = 0
+
+
+def get_pool(workers):
+    global pool, pool_workers
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.terminate()
+        pool = multiprocessing.Pool(workers)
+        pool_workers = workers
+    return pool
+
+
+def search_root(job):
+    """
+    Grows one independent tree in a worker process
+
+    Args:
+        job: (bot module name, board, state, iterations, budget, seed)
+
+    Returns:
+        The (action, wins, visits) of every child of the root, and the
+        move_stats of the search
+    """
+    module_name, board, state, iterations, budget, seed = job
+    random.seed(seed)
+    module = importlib.import_module(module_name)
+    root = module.search(board, state, iterations, budget)
+    return [(action, child.wins, child.visits) for action, child in root.child_nodes.items()], module.move_stats
+
+
+def root_parallel(module_name, board, state, iterations, workers, budget=None):
+    """
+    Root parallelization: every worker searches its own tree from state for
+    the given number of iterations or seconds, and the statistics of the root
+    children are summed over the trees. Module settings other than those are
+    the ones the workers were started with.
+
+    Args:
+        module_name: name of a bot module with a search(board, state, iterations, budget) function
+        board: the game setup
+        state: the state to search from
+        iterations: iterations per worker, None for no limit
+        workers: number of worker processes
+        budget: seconds per worker, None for no limit
+
+    Returns:
+        A dict of every root action to its summed (wins, visits), and the
+        iterations and tree nodes summed over the workers with the deepest level
+    """
+    jobs = [(module_name, board, state, iterations, budget, random.getrandbits(32)) for _ in range(workers)]
+    totals = {}
+    stats = {'iterations': 0, 'nodes': 0, 'depth': 0}
+    for results, worker_stats in get_pool(workers).map(search_root, jobs):
+        for action, wins, visits in results:
+            total_wins, total_visits = totals.get(action, (0, 0))
+            totals[action] = (total_wins + wins, total_visits + visits)
+        stats['iterations'] += worker_stats['iterations']
+        stats['nodes'] += worker_stats['nodes']
+        stats['depth'] = max(stats['depth'], worker_stats['depth'])
+    return totals, stats
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+
+class TranspositionTable(object):
+    """ Maps game states to the tree node that holds their statistics.
+
+    A position reached again through a different order of moves is linked to
+    the node already built for it, so the tree becomes a DAG and every path to
+    the position shares its wins and visits. The least recently used states
+    are forgotten once capacity is reached; their nodes stay in the tree.
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity:   The most states kept before the least recently used is dropped.
+        """
+        self.capacity = capacity
+        self.nodes = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.nodes),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def get(self, state):
+        node = self.nodes.get(state)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.nodes.move_to_end(state)
+        return node
+
+    def put(self, state, node):
+        self.nodes[state] = node
+        if len(self.nodes) > self.capacity:
+            self.nodes.popitem(last=False)
+            self.evictions += 1
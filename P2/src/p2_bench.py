@@ -0,0 +1,230 @@
+import sys
+import random
+import tracemalloc
+import importlib.util
+from timeit import default_timer as time
+
+import p2_t3
+import p2_bitboard
+import mcts_vanilla
+import mcts_modified
+import mcts_array
+
+BOARDS = dict(
+    p2_t3=p2_t3.Board,
+    p2_bitboard=p2_bitboard.Board,
+)
+
+SEED = 146
+
+
+def random_games(board, games, seed=SEED):
+    """
+    Plays random games to the end, the work a rollout does
+
+    Returns:
+        The number of moves played and the seconds it took
+    """
+    rng = random.Random(seed)
+    moves = 0
+    start = time()
+    for _ in range(games):
+        state = board.starting_state()
+        while not board.is_ended(state):
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+            moves += 1
+    return moves, time() - start
+
+
+def bench_moves(games=2000):
+    """
+    Returns:
+        A list of (board, moves, moves per second, speedup over p2_t3)
+    """
+    rows = []
+    baseline = None
+    for name, board in BOARDS.items():
+        moves, elapsed = random_games(board(), games)
+        rate = moves / elapsed
+        baseline = baseline or rate
+        rows.append((name, moves, rate, rate / baseline))
+    return rows
+
+
+def midgame_state(board, moves=20, seed=SEED):
+    rng = random.Random(seed)
+    state = board.starting_state()
+    for _ in range(moves):
+        state = board.next_state(state, rng.choice(board.legal_actions(state)))
+    return state
+
+
+def bench_parallel(bot=mcts_vanilla, worker_counts=(1, 2, 4), iterations=500, board=None):
+    """
+    Times one think() of a bot at each worker count, every worker running
+    iterations rounds of its own tree
+
+    Returns:
+        A list of (workers, total iterations, seconds, iterations per second,
+        scaling over one worker)
+    """
+    board = board or p2_bitboard.Board()
+    state = midgame_state(board)
+    saved = bot.workers, bot.num_nodes
+    bot.num_nodes = iterations
+
+    rows = []
+    baseline = None
+    try:
+        for workers in worker_counts:
+            bot.workers = workers
+            if workers > 1:
+                # the first call starts the pool, which is not what is measured
+                bot.think(board, state)
+            start = time()
+            bot.think(board, state)
+            elapsed = time() - start
+            rate = workers * iterations / elapsed
+            baseline = baseline or rate
+            rows.append((workers, workers * iterations, elapsed, rate, rate / baseline))
+    finally:
+        bot.workers, bot.num_nodes = saved
+    return rows
+
+
+def bench_iterations(bots=(mcts_vanilla, mcts_modified), iterations=500, board=None):
+    """
+    Times one think() of every bot from the same midgame state
+
+    Returns:
+        A list of (bot, iterations, seconds, iterations per second, deepest level)
+    """
+    board = board or p2_bitboard.Board()
+    state = midgame_state(board)
+    rows = []
+    for bot in bots:
+        saved = bot.num_nodes
+        bot.num_nodes = iterations
+        try:
+            start = time()
+            bot.think(board, state)
+            elapsed = time() - start
+        finally:
+            bot.num_nodes = saved
+        depth = bot.move_stats['depth'] if getattr(bot, 'move_stats', None) else None
+        rows.append((bot.__name__, iterations, elapsed, iterations / elapsed, depth))
+    return rows
+
+
+def load_bot(filename, name='baseline_bot'):
+    """
+    Imports a bot module from a file under another name, so an older version
+    (e.g. from git show) can be benchmarked next to the current one
+    """
+    spec = importlib.util.spec_from_file_location(name, filename)
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    return bot
+
+
+def play_match(player1, player2, games, board=None, seed=SEED):
+    """
+    Plays games between two think functions, swapping who moves first every game
+
+    Returns:
+        A dict of the wins of player1 and player2 and the draws
+    """
+    board = board or p2_bitboard.Board()
+    random.seed(seed)
+    wins = {'player1': 0, 'player2': 0, 'draw': 0}
+    for game in range(games):
+        first, second = (player1, player2) if game % 2 == 0 else (player2, player1)
+        state = board.starting_state()
+        while not board.is_ended(state):
+            bot = first if board.current_player(state) == 1 else second
+            state = board.next_state(state, bot(board, state))
+        points = board.points_values(state)
+        if points[1] == points[2]:
+            wins['draw'] += 1
+        elif (points[1] > points[2]) == (first is player1):
+            wins['player1'] += 1
+        else:
+            wins['player2'] += 1
+    return wins
+
+
+def null_rollout(board, state, identity):
+    # a simulation that costs nothing, so only the tree is measured
+    return 0
+
+
+def bench_node_store(bot=mcts_vanilla, iterations=5000, board=None):
+    """
+    Grows MCTSNode and ArrayTree trees from the same midgame state, with the
+    bot's rollout and with null_rollout
+
+    Returns:
+        A list of (store, rollout, nodes, seconds, nodes per second, bytes per node)
+    """
+    board = board or p2_bitboard.Board()
+    state = midgame_state(board)
+    saved = bot.rollout
+
+    rows = []
+    try:
+        for rollout in (saved, null_rollout):
+            bot.rollout = rollout
+            start = time()
+            bot.search(board, state, iterations)
+            elapsed = time() - start
+            nodes = bot.move_stats['nodes']
+
+            # tracing slows allocation down, so the size comes from a second tree
+            random.seed(SEED)
+            tracemalloc.start()
+            root = bot.search(board, state, iterations)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            rows.append(('MCTSNode', rollout.__name__, nodes, elapsed, nodes / elapsed, size / bot.move_stats['nodes']))
+            del root
+
+            tree, stats = mcts_array.search(board, state, rollout, iterations, explore_factor=bot.explore_factor)
+            nodes = stats['nodes']
+            rows.append(('ArrayTree', rollout.__name__, nodes, stats['seconds'], nodes / stats['seconds'],
+                         stats['bytes'] / nodes))
+    finally:
+        bot.rollout = saved
+    return rows
+
+
+if __name__ == '__main__':
+
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    baseline = load_bot(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    print("%-12s %10s %12s %8s" % ('board', 'moves', 'moves/s', 'speedup'))
+    for row in bench_moves(games):
+        print("%-12s %10d %12.0f %8.2f" % row)
+
+    print()
+    print("%-8s %10s %8s %10s %8s" % ('workers', 'iterations', 'seconds', 'iter/s', 'scaling'))
+    for row in bench_parallel():
+        print("%-8d %10d %8.2f %10.0f %8.2f" % row)
+
+    print()
+    print("%-14s %10s %8s %10s %6s" % ('bot', 'iterations', 'seconds', 'iter/s', 'depth'))
+    bots = (mcts_vanilla, mcts_modified) if baseline is None else (mcts_vanilla, baseline)
+    for row in bench_iterations(bots):
+        print("%-14s %10d %8.2f %10.0f %6s" % row)
+
+    if baseline is not None:
+        # the same iterations per move, so only the search itself differs
+        mcts_vanilla.num_nodes = baseline.num_nodes = 300
+        wins = play_match(mcts_vanilla.think, baseline.think, 40)
+        print()
+        print("mcts_vanilla %(player1)d, baseline %(player2)d, draws %(draw)d" % wins)
+
+    print()
+    print("%-10s %-13s %8s %8s %10s %8s" % ('store', 'rollout', 'nodes', 'seconds', 'nodes/s', 'B/node'))
+    for row in bench_node_store():
+        print("%-10s %-13s %8d %8.2f %10.0f %8.0f" % row)
@@ -0,0 +1,154 @@
+import p2_t3
+
+# The whole game packed into one integer. Sub-board i (3 * R + C) keeps the
+# squares of player 1 in bits 18 * i to 18 * i + 8 and those of player 2 in
+# the next nine. Above them come the won (or full) sub-boards of player 1 and
+# player 2, the sub-board the next action is constrained to (ANY if none) and
+# the player to move, 0 for player 1 and 1 for player 2.
+
+num_players = p2_t3.num_players
+positions = p2_t3.positions
+
+BIG_SHIFT = 162
+CONSTRAINT_SHIFT = 180
+PLAYER_SHIFT = 184
+
+ANY = 9
+CONSTRAINT_MASK = 0xf << CONSTRAINT_SHIFT
+PLAYER_BIT = 1 << PLAYER_SHIFT
+
+# whether a 9-bit board has three in a row
+WIN = tuple(any(mask & w == w for w in p2_t3.Board.wins) for mask in range(512))
+
+# the (r, c) squares of every 9-bit board, in legal_actions order
+SQUARES = tuple(tuple(divmod(k, 3) for k in range(9) if mask & (1 << k)) for mask in range(512))
+
+# the legal actions of sub-board i given the 9-bit mask of its free squares
+ACTIONS = tuple(
+    tuple(tuple((i // 3, i % 3, r, c) for r, c in SQUARES[free]) for free in range(512))
+    for i in range(9)
+)
+
+
+def from_tuple(state):
+    """ Packs a p2_t3 state tuple into an integer. """
+    packed = 0
+    for i in range(18):
+        packed |= state[i] << (9 * i)
+    packed |= state[18] << BIG_SHIFT
+    packed |= state[19] << (BIG_SHIFT + 9)
+    constraint = ANY if state[20] is None else 3 * state[20] + state[21]
+    packed |= constraint << CONSTRAINT_SHIFT
+    packed |= (state[22] - 1) << PLAYER_SHIFT
+    return packed
+
+
+def to_tuple(state):
+    """ Unpacks an integer state into the p2_t3 state tuple. """
+    constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+    R, C = (None, None) if constraint == ANY else divmod(constraint, 3)
+    return (tuple((state >> (9 * i)) & 0x1ff for i in range(20))
+            + (R, C, ((state >> PLAYER_SHIFT) & 1) + 1))
+
+
+class Board(p2_t3.Board):
+    """ p2_t3.Board with the state packed into one integer.
+
+    Win checks are lookups in a 512-entry table of 9-bit boards, and the legal
+    actions of a sub-board are looked up by the mask of its free squares. The display and
+    server conversions go through the p2_t3 tuple.
+    """
+
+    def starting_state(self):
+        return ANY << CONSTRAINT_SHIFT
+
+    def display(self, state, action, _unicode=True):
+        return p2_t3.Board.display(self, to_tuple(state), action, _unicode)
+
+    def pack_state(self, data):
+        return from_tuple(p2_t3.Board.pack_state(self, data))
+
+    def unpack_state(self, state):
+        return p2_t3.Board.unpack_state(self, to_tuple(state))
+
+    def next_state(self, state, action):
+        R, C, r, c = action
+        i = 3 * R + C
+        player = (state >> PLAYER_SHIFT) & 1
+
+        state |= 1 << (18 * i + 9 * player + 3 * r + c)
+        sub = (state >> (18 * i)) & 0x3ffff
+        if WIN[(sub >> (9 * player)) & 0x1ff]:
+            state |= 1 << (BIG_SHIFT + 9 * player + i)
+        elif (sub | (sub >> 9)) & 0x1ff == 0x1ff:
+            state |= (1 | 1 << 9) << (BIG_SHIFT + i)
+
+        big = (state >> BIG_SHIFT) | (state >> (BIG_SHIFT + 9))
+        constraint = ANY if big & (1 << (3 * r + c)) else 3 * r + c
+
+        return (state & ~CONSTRAINT_MASK | constraint << CONSTRAINT_SHIFT) ^ PLAYER_BIT
+
+    def is_legal(self, state, action):
+        R, C, r, c = action
+        if (R, C) not in positions or (r, c) not in positions:
+            return False
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        if constraint != ANY and constraint != 3 * R + C:
+            return False
+        return bool(self.free_squares(state, 3 * R + C) & positions[(r, c)])
+
+    def free_squares(self, state, i):
+        # the empty squares of sub-board i, none if it is won or full
+        big = (state >> BIG_SHIFT) | (state >> (BIG_SHIFT + 9))
+        if big & (1 << i):
+            return 0
+        sub = state >> (18 * i)
+        return ~(sub | (sub >> 9)) & 0x1ff
+
+    def legal_actions(self, state):
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        if constraint != ANY:
+            return list(ACTIONS[constraint][self.free_squares(state, constraint)])
+
+        actions = []
+        for i in range(9):
+            actions.extend(ACTIONS[i][self.free_squares(state, i)])
+        return actions
+
+    def previous_player(self, state):
+        return 2 - ((state >> PLAYER_SHIFT) & 1)
+
+    def current_player(self, state):
+        return 1 + ((state >> PLAYER_SHIFT) & 1)
+
+    def big_boards(self, state):
+        # the sub-boards won by player 1 and player 2, and all finished ones
+        b1 = (state >> BIG_SHIFT) & 0x1ff
+        b2 = (state >> (BIG_SHIFT + 9)) & 0x1ff
+        return b1 & ~b2, b2 & ~b1, b1 | b2
+
+    def is_ended(self, state):
+        p1, p2, finished = self.big_boards(state)
+        return WIN[p1] or WIN[p2] or finished == 0x1ff
+
+    def win_values(self, state):
+        p1, p2, finished = self.big_boards(state)
+        if WIN[p1]:
+            return {1: 1, 2: 0}
+        if WIN[p2]:
+            return {1: 0, 2: 1}
+        if finished == 0x1ff:
+            return {1: 0.5, 2: 0.5}
+
+    def owned_boxes(self, state):
+        p1, p2, finished = self.big_boards(state)
+        return dict(((k // 3, k % 3), 1 if p1 & (1 << k) else 2 if p2 & (1 << k) else 0) for k in range(9))
+
+    def points_values(self, state):
+        p1, p2, finished = self.big_boards(state)
+        if WIN[p1]:
+            return {1: 1, 2: -1}
+        if WIN[p2]:
+            return {1: -1, 2: 1}
+        if finished == 0x1ff:
+            return {1: 0, 2: 0}